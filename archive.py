@@ -0,0 +1,151 @@
+import asyncio
+import datetime
+import logging
+import os
+
+from sqlalchemy import delete,func,insert,select,text
+
+from database import Session,engine
+from models import Order,OrderArchive
+from order_stats import order_stats
+
+
+logger = logging.getLogger(__name__)
+
+# Delivered orders untouched for this many days get archived
+ARCHIVE_AFTER_DAYS = float(os.environ.get('ARCHIVE_AFTER_DAYS','30'))
+
+# Number of orders moved per transaction
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE','1000'))
+
+# Seconds between two archival runs
+ARCHIVE_INTERVAL = float(os.environ.get('ARCHIVE_INTERVAL','3600'))
+
+ARCHIVED_COLUMNS = ('id','quantity','order_status','pizza_size','unit_price_cents','user_id','created_at','updated_at')
+
+
+def _month_start(moment):
+    return datetime.datetime(moment.year,moment.month,1)
+
+
+def _next_month(moment):
+    return datetime.datetime(moment.year + moment.month // 12,moment.month % 12 + 1,1)
+
+
+def ensure_archive_partitions(session,oldest,newest):
+    """
+    Creates the monthly Order_Archive partitions covering a time range.
+
+    Only PostgreSQL partitions the archive, on other backends this is a
+    no-op.
+
+    Args:
+      session (Session): The session to create the partitions with.
+      oldest (datetime): The earliest created_at that has to fit.
+      newest (datetime): The latest created_at that has to fit.
+    """
+    if session.bind.dialect.name != 'postgresql':
+        return
+
+    month = _month_start(oldest)
+    while month <= newest:
+        following = _next_month(month)
+        session.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{OrderArchive.__tablename__}_{month:%Y_%m}" '
+            f'PARTITION OF "{OrderArchive.__tablename__}" '
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{following:%Y-%m-%d}')"
+        ))
+        month = following
+
+
+def archive_batch(session,cutoff,batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Moves one batch of delivered orders into Order_Archive.
+
+    Args:
+      session (Session): The session to move the orders with.
+      cutoff (datetime): Only orders last updated before this are moved.
+      batch_size (int, optional): The most orders to move.
+
+    Returns:
+      int: The number of orders moved.
+    """
+    ids = [id for id, in session.query(Order.id)
+                                .filter(Order.order_status=='DELIVERED',
+                                        Order.updated_at<cutoff)
+                                .order_by(Order.id)
+                                .limit(batch_size)
+                                .with_for_update(skip_locked=True)]
+    if not ids:
+        return 0
+
+    groups = session.query(Order.order_status,
+                           Order.pizza_size,
+                           func.count(Order.id),
+                           func.sum(Order.quantity),
+                           func.min(Order.created_at),
+                           func.max(Order.created_at)
+                           ).filter(Order.id.in_(ids)).group_by(Order.order_status,Order.pizza_size).all()
+
+    ensure_archive_partitions(session,
+                              min(group[4] for group in groups),
+                              max(group[5] for group in groups))
+
+    columns = [getattr(Order,column) for column in ARCHIVED_COLUMNS]
+    session.execute(insert(OrderArchive).from_select(list(ARCHIVED_COLUMNS),
+                                                     select(*columns).where(Order.id.in_(ids))))
+    session.execute(delete(Order).where(Order.id.in_(ids)).execution_options(synchronize_session=False))
+    session.commit()
+
+    for order_status,pizza_size,count,quantity,_,_ in groups:
+        order_stats.remove(order_status,pizza_size,quantity,count)
+
+    return len(ids)
+
+
+def archive_delivered_orders(older_than_days=ARCHIVE_AFTER_DAYS,batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Archives every delivered order older than the given age, batch by batch.
+
+    Args:
+      older_than_days (float, optional): How long ago the order must have
+        been last updated.
+      batch_size (int, optional): The number of orders moved per transaction.
+
+    Returns:
+      int: The number of orders moved.
+
+    Examples:
+      >>> archive_delivered_orders(older_than_days=30)
+      1200
+    """
+    moved = 0
+
+    with Session(bind=engine) as session:
+        # updated_at is set by the database clock, so the cutoff is too
+        cutoff = session.scalar(select(func.now())) - datetime.timedelta(days=older_than_days)
+
+        while True:
+            batch = archive_batch(session,cutoff,batch_size)
+            moved += batch
+            if batch < batch_size:
+                return moved
+
+
+async def archive_periodically(interval=ARCHIVE_INTERVAL):
+    """
+    Archives delivered orders every `interval` seconds, forever.
+
+    Nothing is urgent about archiving, so the first run waits an interval
+    rather than adding to every restart of the worker. A failed run is
+    logged and tried again an interval later.
+
+    Args:
+      interval (float, optional): The number of seconds between two runs.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(archive_delivered_orders)
+        except Exception:
+            logger.exception("Archiving delivered orders failed")
@@ -1,9 +1,8 @@
 from fastapi import APIRouter,status,Depends
-from database import Session,engine
+from database import Session,engine,router
 from schemas import SignupModel,LoginModel
 from models import User
 from fastapi.exceptions import HTTPException
-from werkzeug.security import generate_password_hash,check_password_hash
 from fastapi_jwt_auth import AuthJWT
 from fastapi.encoders import jsonable_encoder
 
@@ -57,6 +56,9 @@ async def signup(user:SignupModel):
       >>> signup(user)
       User(username, email, password, is_active, is_staff)
     """
+    # Imported here, werkzeug is slow to import and only needed by two routes
+    from werkzeug.security import generate_password_hash
+
     db_email = session.query(User).filter(User.email==user.email).first()
     if db_email is not None:
         return HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
@@ -82,6 +84,9 @@ async def signup(user:SignupModel):
     session.add(new_user)
     session.commit()
 
+    # The new user's first requests must find them before replicas catch up
+    router.mark_write(new_user.username)
+
     return new_user
 
 
@@ -104,6 +109,8 @@ async def login(user:LoginModel,Authorize:AuthJWT=Depends()):
       >>> login(user, Authorize)
       {"access_token":access_token, "refresh_token":refresh_token}
     """
+    from werkzeug.security import check_password_hash
+
     db_user = session.query(User).filter(User.username==user.username).first()
 
     if db_user and check_password_hash(db_user.password,user.password):
@@ -0,0 +1,94 @@
+"""
+Hot-path order query latency before and after archiving delivered orders.
+
+Fills a throwaway SQLite database with orders, 90% of them delivered long
+ago, times the queries the order routes run, archives the delivered orders
+and times the same queries again.
+
+    python benchmarks/bench_archive.py [number_of_orders]
+"""
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+DATABASE_FILE = os.path.join(tempfile.mkdtemp(),'bench_archive.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE_FILE}'
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Session,engine
+from migrations import upgrade
+from models import Order,User
+from archive import archive_delivered_orders
+from order_stats import OrderStats
+
+engine.echo = False
+
+USERS = 1000
+REPEATS = 5
+
+
+def populate(number_of_orders):
+    long_ago = datetime.datetime.utcnow() - datetime.timedelta(days=365)
+    now = datetime.datetime.utcnow()
+
+    with Session(bind=engine) as session:
+        session.execute(User.__table__.insert(),[
+            {"username":f"user{i}","email":f"user{i}@example.com","password":"x",
+             "is_active":True,"is_staff":False}
+            for i in range(USERS)
+        ])
+        session.execute(Order.__table__.insert(),[
+            {"quantity":1 + i % 4,
+             "order_status":"DELIVERED" if i % 10 else "PENDING",
+             "pizza_size":"SMALL",
+             "unit_price_cents":899,
+             "user_id":1 + i % USERS,
+             "created_at":long_ago if i % 10 else now,
+             "updated_at":long_ago if i % 10 else now}
+            for i in range(number_of_orders)
+        ])
+        session.commit()
+
+
+def timed(query):
+    samples = []
+    for _ in range(REPEATS):
+        with Session(bind=engine) as session:
+            start = time.perf_counter()
+            query(session)
+            samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+HOT_PATHS = {
+    "user's orders":lambda session:session.query(Order).filter(Order.user_id==USERS // 2).all(),
+    "all orders":lambda session:session.query(Order).all(),
+    "stats GROUP BY":lambda session:OrderStats().reconcile(session),
+}
+
+
+def main():
+    number_of_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    upgrade(engine)
+    populate(number_of_orders)
+
+    before = {name:timed(query) for name,query in HOT_PATHS.items()}
+
+    start = time.perf_counter()
+    moved = archive_delivered_orders(older_than_days=30)
+    archive_seconds = time.perf_counter() - start
+
+    after = {name:timed(query) for name,query in HOT_PATHS.items()}
+
+    print(f"{number_of_orders} orders, archived {moved} in {archive_seconds:.1f}s")
+    print(f"{'query':<22}{'before ms':>12}{'after ms':>12}")
+    for name in HOT_PATHS:
+        print(f"{name:<22}{before[name]:>12.2f}{after[name]:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Per-order PATCHes versus one batch status transition.
+
+Moves 500 PENDING orders to IN-TRANSIT the way update_order_status does it,
+one user lookup, order load and commit per order, and then with
+transition_orders in a single UPDATE, on a throwaway SQLite database.
+
+    python benchmarks/bench_batch_status.py [ids_per_call]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+DATABASE_FILE = os.path.join(tempfile.mkdtemp(),'bench_batch_status.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE_FILE}'
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Session,engine
+from migrations import upgrade
+from models import Order,User
+from order import transition_orders
+
+engine.echo = False
+
+REPEATS = 5
+
+
+def populate(session,count):
+    session.query(Order).delete()
+    session.execute(Order.__table__.insert(),[
+        {"quantity":1,"order_status":"PENDING","pizza_size":"SMALL","unit_price_cents":899,"user_id":1}
+        for _ in range(count)
+    ])
+    session.commit()
+    return [id for id, in session.query(Order.id)]
+
+
+def one_by_one(session,ids):
+    for id in ids:
+        session.query(User).filter(User.username=="dispatcher").first()
+        order = session.query(Order).filter(Order.id==id).first()
+        order.order_status = "IN-TRANSIT"
+        session.commit()
+
+
+def batched(session,ids):
+    session.query(User).filter(User.username=="dispatcher").first()
+    transition_orders(session,ids,"IN-TRANSIT")
+
+
+def timed(update,count):
+    samples = []
+    for _ in range(REPEATS):
+        with Session(bind=engine) as session:
+            ids = populate(session,count)
+            start = time.perf_counter()
+            update(session,ids)
+            samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    upgrade(engine)
+    with Session(bind=engine) as session:
+        session.add(User(username="dispatcher",email="dispatcher@example.com",
+                         password="x",is_active=True,is_staff=True))
+        session.commit()
+
+    per_order = timed(one_by_one,count)
+    batch = timed(batched,count)
+
+    print(f"{count} ids per call")
+    print(f"one PATCH per order   {per_order:10.1f} ms")
+    print(f"one batch UPDATE      {batch:10.1f} ms")
+    print(f"speed-up              {per_order / batch:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
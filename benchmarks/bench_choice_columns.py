@@ -0,0 +1,86 @@
+"""
+Row load and serialization cost of ChoiceType strings versus ChoiceCode.
+
+Loads the same orders through an ORM model using sqlalchemy_utils'
+ChoiceType (how order_status and pizza_size used to be stored) and through
+one using ChoiceCode SMALLINTs, then runs them through jsonable_encoder like
+the order listings do. Needs sqlalchemy_utils for the comparison.
+
+    python benchmarks/bench_choice_columns.py [number_of_orders]
+"""
+import os
+import statistics
+import sys
+import time
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import Column,Integer,create_engine
+from sqlalchemy.orm import Session,declarative_base
+from sqlalchemy_utils import ChoiceType
+
+from models import ChoiceCode,Order
+
+REPEATS = 5
+
+Base = declarative_base()
+
+
+class StringOrder(Base):
+    __tablename__ = 'string_orders'
+
+    id = Column(Integer,primary_key=True)
+    quantity = Column(Integer,nullable=False)
+    order_status = Column(ChoiceType(choices=Order.ORDER_STATUSES))
+    pizza_size = Column(ChoiceType(choices=Order.PIZZA_SIZES))
+
+
+class CodeOrder(Base):
+    __tablename__ = 'code_orders'
+
+    id = Column(Integer,primary_key=True)
+    quantity = Column(Integer,nullable=False)
+    order_status = Column(ChoiceCode(Order.ORDER_STATUSES))
+    pizza_size = Column(ChoiceCode(Order.PIZZA_SIZES))
+
+
+def timed(engine,model):
+    load,serialize = [],[]
+    for _ in range(REPEATS):
+        with Session(bind=engine) as session:
+            start = time.perf_counter()
+            orders = session.query(model).all()
+            loaded = time.perf_counter()
+            jsonable_encoder(orders)
+            load.append(loaded - start)
+            serialize.append(time.perf_counter() - loaded)
+    return statistics.median(load) * 1000,statistics.median(serialize) * 1000
+
+
+def main():
+    number_of_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+
+    rows = [{"id":i,
+             "quantity":1 + i % 4,
+             "order_status":Order.ORDER_STATUSES[i % 3][0],
+             "pizza_size":Order.PIZZA_SIZES[i % 4][0]}
+            for i in range(number_of_orders)]
+    with Session(bind=engine) as session:
+        session.execute(StringOrder.__table__.insert(),rows)
+        session.execute(CodeOrder.__table__.insert(),rows)
+        session.commit()
+
+    print(f"{number_of_orders} orders")
+    print(f"{'column type':<14}{'load ms':>10}{'serialize ms':>14}")
+    for name,model in (("ChoiceType",StringOrder),("ChoiceCode",CodeOrder)):
+        load,serialize = timed(engine,model)
+        print(f"{name:<14}{load:>10.1f}{serialize:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
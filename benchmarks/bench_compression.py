@@ -0,0 +1,81 @@
+"""
+Bandwidth versus CPU for compressing order listings.
+
+Builds the JSON GET /order/order returns for a realistic set of orders and
+compresses it at several gzip levels and brotli qualities, reporting the
+compressed size, the CPU time and the time the body would take over a
+mobile link, compression included.
+
+    python benchmarks/bench_compression.py [number_of_orders] [link_mbit_s]
+"""
+import datetime
+import gzip
+import json
+import random
+import statistics
+import sys
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+REPEATS = 5
+STATUSES = ('PENDING','IN-TRANSIT','DELIVERED')
+SIZES = ('SMALL','MEDIUM','LARGE','EXTRA-LARGE')
+
+
+def order_listing(number_of_orders):
+    random.seed(0)
+    start = datetime.datetime(2026,1,1)
+    orders = []
+    for id in range(1,number_of_orders + 1):
+        created_at = start + datetime.timedelta(seconds=random.randrange(0,300 * 86400))
+        updated_at = created_at + datetime.timedelta(seconds=random.randrange(0,7200))
+        orders.append({
+            "id":id,
+            "quantity":random.randint(1,6),
+            "order_status":random.choice(STATUSES),
+            "pizza_size":random.choice(SIZES),
+            "user_id":random.randint(1,5000),
+            "created_at":created_at.isoformat(),
+            "updated_at":updated_at.isoformat(),
+        })
+    return json.dumps(orders).encode()
+
+
+def timed(compress,body):
+    samples = []
+    for _ in range(REPEATS):
+        start = time.process_time()
+        compressed = compress(body)
+        samples.append(time.process_time() - start)
+    return compressed,statistics.median(samples) * 1000
+
+
+def main():
+    number_of_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    link_mbit_s = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+
+    body = order_listing(number_of_orders)
+    bytes_per_ms = link_mbit_s * 1_000_000 / 8 / 1000
+
+    codecs = [("identity",lambda data:data)]
+    codecs += [(f"gzip -{level}",lambda data,level=level:gzip.compress(data,compresslevel=level))
+               for level in (1,6,9)]
+    if brotli is not None:
+        codecs += [(f"br q{quality}",lambda data,quality=quality:brotli.compress(data,quality=quality))
+                   for quality in (1,4,6,11)]
+
+    print(f"{number_of_orders} orders, {len(body) / 1024:.0f} KiB of JSON, {link_mbit_s:g} Mbit/s link")
+    print(f"{'codec':<10}{'KiB':>9}{'ratio':>8}{'CPU ms':>9}{'transfer ms':>13}{'total ms':>10}")
+    for name,compress in codecs:
+        compressed,cpu = timed(compress,body)
+        transfer = len(compressed) / bytes_per_ms
+        print(f"{name:<10}{len(compressed) / 1024:>9.0f}{len(body) / len(compressed):>8.1f}"
+              f"{cpu:>9.1f}{transfer:>13.0f}{cpu + transfer:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Cost of one dispatch tick over 100k pending orders.
+
+Fills a throwaway SQLite database with pending orders and times the parts of
+DispatchScheduler.tick: loading and ranking the whole queue, the refresh of
+an already loaded queue every tick does, planning runs for every pending
+order at once, and dispatching one default batch of runs.
+Also times the ranked query serving the queue on other workers.
+
+    python benchmarks/bench_dispatch.py [pending_orders]
+"""
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+DATABASE_FILE = os.path.join(tempfile.mkdtemp(),'bench_dispatch.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE_FILE}'
+os.environ['DATABASE_ECHO'] = '0'
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Session,engine
+from migrations import upgrade
+from models import Order
+from dispatch import DISPATCH_BATCH_SIZE,DispatchScheduler
+
+REPEATS = 5
+
+
+def populate(pending_orders):
+    random.seed(0)
+    now = datetime.datetime.utcnow()
+    sizes = list(Order.SIZE_WEIGHTS)
+    with Session(bind=engine) as session:
+        session.execute(Order.__table__.insert(),[
+            {"quantity":random.randint(1,4),
+             "order_status":"PENDING",
+             "pizza_size":random.choice(sizes),
+             "unit_price_cents":899,
+             "created_at":now - datetime.timedelta(seconds=random.randrange(3600)),
+             "updated_at":now}
+            for _ in range(pending_orders)
+        ])
+        session.commit()
+
+
+def timed(function):
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - start)
+    return result,statistics.median(samples) * 1000
+
+
+def main():
+    pending_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    upgrade(engine)
+    populate(pending_orders)
+
+    scheduler = DispatchScheduler(batch_size=pending_orders)
+
+    with Session(bind=engine) as session:
+        _,load = timed(lambda:scheduler.refresh(session,full=True))
+        _,refresh = timed(lambda:scheduler.refresh(session))
+        _,query = timed(lambda:scheduler.query(session,50))
+
+        def plan_everything():
+            scheduler.refresh(session,full=True)
+            start = time.perf_counter()
+            runs = scheduler.plan()
+            return runs,time.perf_counter() - start
+
+        samples = [plan_everything() for _ in range(REPEATS)]
+        runs = samples[0][0]
+        plan = statistics.median(seconds for _,seconds in samples) * 1000
+
+        scheduler.batch_size = DISPATCH_BATCH_SIZE
+        scheduler.refresh(session,full=True)
+        batch = scheduler.plan()
+        start = time.perf_counter()
+        dispatched = scheduler.dispatch(session,batch)
+        dispatch = (time.perf_counter() - start) * 1000
+
+    loads = [sum(entry.load for entry in run) for run in runs]
+    print(f"{pending_orders} pending orders, run capacity {scheduler.run_capacity:g}")
+    print(f"load and rank the queue         {load:10.1f} ms")
+    print(f"refresh a loaded queue          {refresh:10.1f} ms  (every tick, reads the pending ids)")
+    print(f"head of the queue from SQL      {query:10.1f} ms  (GET /dispatch/queue off the scheduler's worker)")
+    print(f"plan runs for all of them       {plan:10.1f} ms  "
+          f"({len(runs)} runs, {statistics.mean(loads) / scheduler.run_capacity:.0%} full on average)")
+    print(f"dispatch one batch of {DISPATCH_BATCH_SIZE:<6}    {dispatch:10.1f} ms  "
+          f"({len(dispatched)} runs, one transaction each)")
+
+
+if __name__ == '__main__':
+    main()
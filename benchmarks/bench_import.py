@@ -0,0 +1,50 @@
+"""
+Time it takes to import the app.
+
+Imports main in fresh interpreters with -X importtime and reports the median
+total and the slowest top-level imports of the median run.
+
+    python benchmarks/bench_import.py [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times():
+    environment = dict(os.environ,DATABASE_URL='sqlite://')
+    output = subprocess.run([sys.executable,'-X','importtime','-c','import main'],
+                            cwd=ROOT,env=environment,capture_output=True,text=True,check=True).stderr
+
+    times = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _,cumulative,name = line.split('|')
+        times.append((name,int(cumulative)))
+    return times
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 9
+
+    samples = sorted((import_times() for _ in range(runs)),key=lambda times:times[-1][1])
+    median = samples[len(samples) // 2]
+
+    print(f"import main: {median[-1][1] / 1000:.1f} ms (median of {runs})")
+    print("slowest imports made by main:")
+    made_by_main = []
+    for name,cumulative in median[:-1]:
+        if not name.startswith('  '):
+            made_by_main = []
+        elif not name.startswith('    '):
+            made_by_main.append((name.strip(),cumulative))
+    for name,cumulative in sorted(made_by_main,key=lambda item:-item[1])[:8]:
+        print(f"  {name:<28}{cumulative / 1000:>8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+place_an_order latency with fast and with slow background job handlers.
+
+Places orders through the app while the notification, kitchen ticket and
+audit handlers take 0 ms and then 500 ms each, on a throwaway SQLite
+database. The request latency should stay the same: the handlers run on the
+job queue after the response has gone out.
+
+    python benchmarks/bench_job_queue.py [orders_per_run]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+DATABASE_FILE = os.path.join(tempfile.mkdtemp(),'bench_job_queue.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE_FILE}'
+os.environ.setdefault('JOB_WORKERS','64')
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from database import engine
+from migrations import upgrade
+import jobs
+from main import app
+
+engine.echo = False
+
+HANDLER_DELAYS = (0.0,0.5)
+
+
+def slow_handler(delay):
+    async def handle(payload):
+        await asyncio.sleep(delay)
+    return handle
+
+
+def wait_for_drain(client,headers,timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        metrics = client.get('/jobs/metrics',headers=headers).json()
+        if set(metrics["outbox"]) <= {"done"} and metrics["queue_depth"] == 0:
+            return metrics
+        time.sleep(0.1)
+    raise TimeoutError("The job queue did not drain")
+
+
+def main():
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+    upgrade(engine)
+
+    with TestClient(app) as client:
+        client.post('/auth/signup',json={"username":"bench","email":"bench@example.com",
+                                         "password":"bench","is_staff":True,"is_active":True})
+        token = client.post('/auth/login',json={"username":"bench","password":"bench"}).json()["access_token"]
+        headers = {"Authorization":f"Bearer {token}"}
+
+        print(f"{'handler delay':>14}{'p50 ms':>10}{'p95 ms':>10}{'drain s':>10}")
+        for delay in HANDLER_DELAYS:
+            for kind in ('notification','kitchen_ticket','audit'):
+                jobs.handlers[kind] = slow_handler(delay)
+
+            samples = []
+            start = time.perf_counter()
+            for _ in range(orders):
+                request_start = time.perf_counter()
+                client.post('/order/order',json={"quantity":1,"pizza_size":"SMALL"},headers=headers)
+                samples.append((time.perf_counter() - request_start) * 1000)
+            wait_for_drain(client,headers)
+            drained = time.perf_counter() - start
+
+            samples.sort()
+            print(f"{delay * 1000:>11.0f} ms"
+                  f"{statistics.median(samples):>10.2f}"
+                  f"{samples[int(len(samples) * 0.95)]:>10.2f}"
+                  f"{drained:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Cost of pricing orders from the in-memory menu snapshot.
+
+Compares looking a price up in Menu_Price for every order with reading it
+from the snapshot, then times the staff order report over many orders:
+fetching a row per order through the ORM or the connection, or rows
+grouped by the database, then pricing and summing them with numpy and with
+the pure Python fallback. Needs numpy for the numpy timings.
+
+    python benchmarks/bench_menu.py [number_of_orders]
+"""
+import os
+import statistics
+import sys
+import time
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['DATABASE_ECHO'] = '0'
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import SmallInteger,func,literal,select,type_coerce
+
+import menu
+from database import Session,engine
+from migrations import upgrade
+from models import MenuPrice,Order
+
+REPEATS = 5
+LOOKUPS = 2_000
+
+
+def median_ms(function):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    number_of_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    upgrade(engine)
+    sizes = Order.__table__.c.pizza_size.type.codes
+    statuses = Order.__table__.c.order_status.type.codes
+
+    rows = [{"quantity":1 + i % 4,
+             "order_status":statuses[i % 3],
+             "pizza_size":sizes[i % 4],
+             "unit_price_cents":899 + 300 * (i % 4),
+             "user_id":1 + i % 5_000}
+            for i in range(number_of_orders)]
+    with Session(bind=engine) as session:
+        session.execute(Order.__table__.insert(),rows)
+        session.commit()
+
+    snapshot = menu.menu.reload()
+
+    with Session(bind=engine) as session:
+        def query_each():
+            for i in range(LOOKUPS):
+                price = session.query(MenuPrice.price_cents).filter(MenuPrice.pizza_size==sizes[i % 4]).scalar()
+                price * 2
+
+        def snapshot_each():
+            for i in range(LOOKUPS):
+                snapshot.total(sizes[i % 4],2)
+
+        print(f"{LOOKUPS} order totals")
+        print(f"{'price from':<26}{'ms':>10}")
+        print(f"{'Menu_Price query':<26}{median_ms(query_each):>10.2f}")
+        print(f"{'menu snapshot':<26}{median_ms(snapshot_each):>10.2f}")
+
+        order_status = type_coerce(Order.order_status,SmallInteger)
+        pizza_size = type_coerce(Order.pizza_size,SmallInteger)
+        user_id = func.coalesce(Order.user_id,0)
+        per_order = select(order_status,pizza_size,Order.quantity,user_id,literal(1),
+                           Order.quantity * Order.unit_price_cents)
+        grouped = (select(order_status,pizza_size,func.sum(Order.quantity),user_id,func.count(Order.id),
+                          func.sum(Order.quantity * Order.unit_price_cents))
+                   .group_by(order_status,pizza_size,user_id))
+
+        print()
+        print(f"order report over {number_of_orders} orders")
+        print(f"{'step':<26}{'ms':>10}{'rows':>10}")
+        for name,run,query in (("fetch per order, ORM",session.execute,per_order),
+                               ("fetch per order",session.connection().execute,per_order),
+                               ("fetch grouped",session.connection().execute,grouped)):
+            rows = run(query).all()
+            print(f"{name:<26}{median_ms(lambda:run(query).all()):>10.1f}{len(rows):>10}")
+
+            print(f"{'  price and sum, Python':<26}"
+                  f"{median_ms(lambda:menu._report_python(snapshot,rows,len(statuses),len(sizes),10)):>10.1f}")
+            if menu._import_numpy() is not None:
+                print(f"{'  price and sum, numpy':<26}"
+                      f"{median_ms(lambda:menu._report_numpy(snapshot,rows,len(statuses),len(sizes),10)):>10.1f}")
+
+        print(f"{'whole report':<26}{median_ms(lambda:menu.order_report(session,snapshot)):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Order read throughput of server.py with 1 to N workers.
+
+Starts server.py against a throwaway SQLite database holding a staff user
+and their orders, with 1, 2, 4, ... up to N workers, and hammers the order
+read endpoints from client processes for a fixed time at each step. The
+client processes share the machine with the server, so leave some cores
+free when measuring scaling.
+
+    python benchmarks/bench_workers.py [max_workers] [seconds_per_step]
+"""
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE_FILE = os.path.join(tempfile.mkdtemp(),'bench_workers.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE_FILE}'
+os.environ['DATABASE_ECHO'] = '0'
+sys.path.insert(0,ROOT)
+
+PORT = 8765
+CLIENTS_PER_WORKER = 2
+ORDERS = 50
+PATHS = ('/order/order','/order/user/order','/order/user/order/1','/order/order/1')
+
+
+def populate():
+    from werkzeug.security import generate_password_hash
+
+    from database import Session,engine
+    from migrations import upgrade
+    from models import Order,User
+
+    upgrade(engine)
+    with Session(bind=engine) as session:
+        user = User(username="bench",email="bench@example.com",
+                    password=generate_password_hash("bench"),is_active=True,is_staff=True)
+        session.add(user)
+        session.flush()
+        session.add_all([Order(quantity=1 + i % 4,pizza_size="MEDIUM",unit_price_cents=1199,user_id=user.id)
+                         for i in range(ORDERS)])
+        session.commit()
+
+
+def request(connection,method,path,body=None,headers=None):
+    connection.request(method,path,body=body,headers=headers or {})
+    response = connection.getresponse()
+    return response.status,response.read()
+
+
+def wait_until_up(timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1',PORT)
+            request(connection,'GET','/order/')
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError("server.py did not come up")
+
+
+def client(token,seconds,results):
+    connection = http.client.HTTPConnection('127.0.0.1',PORT)
+    headers = {"Authorization":f"Bearer {token}"}
+    done = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        status,_ = request(connection,'GET',PATHS[done % len(PATHS)],headers=headers)
+        if status == 200:
+            done += 1
+    results.put(done)
+
+
+def measure(workers,seconds):
+    environment = dict(os.environ,WEB_CONCURRENCY=str(workers),PORT=str(PORT),
+                       HOST='127.0.0.1',LOG_LEVEL='warning')
+    server = subprocess.Popen([sys.executable,os.path.join(ROOT,'server.py')],env=environment)
+    try:
+        wait_until_up()
+        connection = http.client.HTTPConnection('127.0.0.1',PORT)
+        _,body = request(connection,'POST','/auth/login',
+                         body=json.dumps({"username":"bench","password":"bench"}),
+                         headers={"Content-Type":"application/json"})
+        token = json.loads(body)["access_token"]
+
+        results = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=client,args=(token,seconds,results))
+                   for _ in range(workers * CLIENTS_PER_WORKER)]
+        for process in clients:
+            process.start()
+        total = sum(results.get() for _ in clients)
+        for process in clients:
+            process.join()
+        return total / seconds
+
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    populate()
+
+    steps = []
+    workers = 1
+    while workers < max_workers:
+        steps.append(workers)
+        workers *= 2
+    steps.append(max_workers)
+
+    print(f"{'workers':>8}{'req/s':>10}{'scaling':>10}")
+    baseline = None
+    for workers in steps:
+        rate = measure(workers,seconds)
+        baseline = baseline or rate
+        print(f"{workers:>8}{rate:>10.0f}{rate / baseline:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import asyncio
+import gzip
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Responses smaller than this many bytes are sent as they are
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get('COMPRESSION_MINIMUM_SIZE','1024'))
+
+# gzip level, 1 (fastest) to 9 (smallest)
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL','6'))
+
+# brotli quality, 0 (fastest) to 11 (smallest)
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY','4'))
+
+# Bodies and chunks at least this many bytes are compressed off the event loop
+COMPRESSION_OFFLOAD_SIZE = int(os.environ.get('COMPRESSION_OFFLOAD_SIZE','65536'))
+
+
+def _accepted_encodings(scope):
+    for name,value in scope['headers']:
+        if name == b'accept-encoding':
+            accepted = {}
+            for part in value.decode('latin-1').split(','):
+                encoding,*params = part.split(';')
+                quality = 1.0
+                for param in params:
+                    key,_,number = param.strip().partition('=')
+                    if key == 'q':
+                        try:
+                            quality = float(number)
+                        except ValueError:
+                            quality = 0.0
+                accepted[encoding.strip().lower()] = quality
+            return accepted
+    return {}
+
+
+def _choose_encoding(scope,offered):
+    # The client's highest q value wins, the order of `offered` breaks ties.
+    # q=0 refuses an encoding, "*" stands for every encoding not listed.
+    accepted = _accepted_encodings(scope)
+    wildcard = accepted.get('*',0.0)
+
+    chosen,best = None,0.0
+    for encoding in offered:
+        quality = accepted.get(encoding,wildcard)
+        if quality > best:
+            chosen,best = encoding,quality
+    return chosen
+
+
+class _GzipStream:
+    def __init__(self,level):
+        self._compressor = zlib.compressobj(level,zlib.DEFLATED,zlib.MAX_WBITS | 16)
+
+    def compress(self,chunk):
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self,chunk):
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self,quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self,chunk):
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self,chunk):
+        return self._compressor.process(chunk) + self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with brotli or gzip, as negotiated by Accept-Encoding.
+
+    The encoding the client gives the highest q value is used, brotli when
+    it ranks brotli and gzip the same.
+
+    Whole bodies under the minimum size go out untouched. Streaming
+    responses are compressed chunk by chunk, each chunk flushed so the client
+    can decode it right away. Bodies or chunks of at least `offload_size`
+    bytes are compressed in a worker thread so the event loop keeps serving.
+    brotli is only offered when the brotli package is installed.
+
+    Attributes:
+      app (ASGIApp): The wrapped application.
+      minimum_size (int): The smallest body worth compressing, in bytes.
+      level (int): The gzip compression level.
+      brotli_quality (int): The brotli quality.
+      offload_size (int): The size from which compression leaves the loop.
+
+    Examples:
+      >>> app.add_middleware(CompressionMiddleware, minimum_size=1024, level=6)
+    """
+
+    def __init__(self,app,minimum_size=COMPRESSION_MINIMUM_SIZE,level=COMPRESSION_LEVEL,
+                 brotli_quality=BROTLI_QUALITY,offload_size=COMPRESSION_OFFLOAD_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.offload_size = offload_size
+
+    async def __call__(self,scope,receive,send):
+        if scope['type'] != 'http':
+            await self.app(scope,receive,send)
+            return
+
+        encoding = _choose_encoding(scope,('br','gzip') if brotli is not None else ('gzip',))
+        if encoding is None:
+            await self.app(scope,receive,send)
+            return
+
+        await self.app(scope,receive,_CompressingSend(self,encoding,send))
+
+    def compress(self,encoding,body):
+        if encoding == 'br':
+            return brotli.compress(body,quality=self.brotli_quality)
+        return gzip.compress(body,compresslevel=self.level)
+
+    def stream(self,encoding):
+        if encoding == 'br':
+            return _BrotliStream(self.brotli_quality)
+        return _GzipStream(self.level)
+
+    async def run(self,function,data):
+        if len(data) >= self.offload_size:
+            return await asyncio.to_thread(function,data)
+        return function(data)
+
+
+class _CompressingSend:
+    def __init__(self,middleware,encoding,send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start = None
+        self.stream = None
+        self.passthrough = False
+
+    def _headers(self,content_length=None):
+        headers = [(name,value) for name,value in self.start['headers']
+                   if name not in (b'content-length',b'vary')]
+        vary = [value for name,value in self.start['headers'] if name == b'vary']
+        vary = b', '.join(vary + [b'Accept-Encoding'])
+
+        headers.append((b'content-encoding',self.encoding.encode()))
+        headers.append((b'vary',vary))
+        if content_length is not None:
+            headers.append((b'content-length',str(content_length).encode()))
+        return headers
+
+    async def __call__(self,message):
+        if message['type'] == 'http.response.start':
+            self.start = message
+            self.passthrough = any(name == b'content-encoding' for name,_ in message['headers'])
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message['type'] != 'http.response.body' or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get('body',b'')
+        more_body = message.get('more_body',False)
+
+        if self.stream is None and not more_body:
+            if len(body) < self.middleware.minimum_size:
+                await self.send(self.start)
+                await self.send(message)
+                return
+
+            compress = lambda data:self.middleware.compress(self.encoding,data)
+            compressed = await self.middleware.run(compress,body)
+            await self.send({**self.start,'headers':self._headers(len(compressed))})
+            await self.send({'type':'http.response.body','body':compressed})
+            return
+
+        if self.stream is None:
+            self.stream = self.middleware.stream(self.encoding)
+            await self.send({**self.start,'headers':self._headers()})
+
+        compress = self.stream.compress if more_body else self.stream.finish
+        await self.send({'type':'http.response.body',
+                         'body':await self.middleware.run(compress,body),
+                         'more_body':more_body})
@@ -0,0 +1,407 @@
+import asyncio
+import heapq
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from typing import NamedTuple
+
+from fastapi import APIRouter,Depends,status
+from fastapi.exceptions import HTTPException
+from fastapi_jwt_auth import AuthJWT
+from sqlalchemy import SmallInteger,case,func,type_coerce
+
+from database import Session,engine,read_session
+from models import Order,User
+from order import transition_orders
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two dispatch ticks
+DISPATCH_TICK_SECONDS = float(os.environ.get('DISPATCH_TICK_SECONDS','30'))
+
+# Most orders dispatched per tick
+DISPATCH_BATCH_SIZE = int(os.environ.get('DISPATCH_BATCH_SIZE','200'))
+
+# Room in one driver run, in pizzas weighted by Order.SIZE_WEIGHTS
+DISPATCH_RUN_CAPACITY = float(os.environ.get('DISPATCH_RUN_CAPACITY','12'))
+
+# Seconds of waiting one unit of weighted load is worth when ranking orders
+DISPATCH_LOAD_PRIORITY = float(os.environ.get('DISPATCH_LOAD_PRIORITY','10'))
+
+# Ticks between two full reloads of the pending orders
+DISPATCH_RESYNC_TICKS = int(os.environ.get('DISPATCH_RESYNC_TICKS','20'))
+
+# Runs kept open for more orders while planning a tick
+OPEN_RUNS = 8
+
+
+class PendingOrder(NamedTuple):
+    """
+    A pending order waiting in the dispatch queue.
+
+    Attributes:
+      rank (float): The sort key, lower goes first.
+      id (int): The id of the order.
+      load (float): The order's quantity weighted by its pizza size.
+      created_at (float): When the order was placed, as a timestamp.
+    """
+    rank:float
+    id:int
+    load:float
+    created_at:float
+
+
+class DispatchScheduler:
+    """
+    Groups pending orders into driver runs and sends them out.
+
+    Pending orders wait in a heap ranked by their creation time minus a
+    bonus for their weighted load, so older and bigger orders go first. The
+    rank of an order never changes as time passes, which keeps the heap
+    valid without re-sorting. Every tick takes up to `batch_size` orders off
+    the heap, packs them first-fit into runs of at most `run_capacity` and
+    moves each run to IN-TRANSIT in its own transaction.
+
+    Every tick reads the ids of all pending orders, which the status index
+    makes cheap, queues the ones it has not seen and forgets the ones no
+    longer pending. New orders are therefore picked up whatever order their
+    ids were committed in. The whole queue is reloaded every `resync_ticks`
+    ticks to re-rank orders that were changed by hand. Orders of a batch
+    whose dispatch failed go back on the heap.
+
+    The runs of the latest tick are kept in shared memory, so every worker
+    server.py forks can report them, not only the one running the loop.
+
+    Attributes:
+      run_capacity (float): The room in one run.
+      batch_size (int): The most orders dispatched per tick.
+      load_priority (float): The seconds of waiting a unit of load is worth.
+      resync_ticks (int): The ticks between two full reloads.
+      last_runs (list): The ids of the orders dispatched on the latest tick, per run.
+
+    Examples:
+      >>> scheduler = DispatchScheduler(run_capacity=12, batch_size=200)
+      >>> scheduler.refresh(session)
+      >>> scheduler.plan()
+      [[PendingOrder(rank=..., id=1, load=4.0, created_at=...)]]
+    """
+
+    def __init__(self,run_capacity=DISPATCH_RUN_CAPACITY,batch_size=DISPATCH_BATCH_SIZE,
+                 load_priority=DISPATCH_LOAD_PRIORITY,resync_ticks=DISPATCH_RESYNC_TICKS):
+        self.run_capacity = run_capacity
+        self.batch_size = batch_size
+        self.load_priority = load_priority
+        self.resync_ticks = resync_ticks
+        self.running = False
+        self._heap = []
+        self._queued = set()
+        self._ticks = 0
+        self._lock = threading.Lock()
+
+        # The latest tick's order ids back to back, and the size of each run
+        self._last_ids = multiprocessing.RawArray('q',batch_size)
+        self._last_sizes = multiprocessing.RawArray('i',batch_size)
+        self._last_count = multiprocessing.RawValue('i',0)
+        self._last_lock = multiprocessing.Lock()
+
+    def __len__(self):
+        return len(self._queued)
+
+    @property
+    def last_runs(self):
+        with self._last_lock:
+            sizes = self._last_sizes[:self._last_count.value]
+            ids = self._last_ids[:sum(sizes)]
+
+        runs,start = [],0
+        for size in sizes:
+            runs.append(ids[start:start + size])
+            start += size
+        return runs
+
+    @last_runs.setter
+    def last_runs(self,runs):
+        # Only whole runs that fit, should batch_size have grown since
+        kept,room = [],len(self._last_ids)
+        for run in runs:
+            if len(run) > room:
+                break
+            kept.append(run)
+            room -= len(run)
+        runs = kept
+
+        ids = [id for run in runs for id in run]
+        with self._last_lock:
+            self._last_ids[:len(ids)] = ids
+            self._last_sizes[:len(runs)] = [len(run) for run in runs]
+            self._last_count.value = len(runs)
+
+    def _rank(self,created_at,load):
+        return created_at - self.load_priority * load
+
+    def refresh(self,session,full=False):
+        """
+        Brings the queue in line with the pending orders in the database.
+
+        Args:
+          session (Session): The session to read the orders with.
+          full (bool, optional): Whether to rebuild the queue from scratch.
+        """
+        query = session.query(Order.id,Order.quantity,Order.pizza_size,Order.created_at)
+
+        if full:
+            rows = query.filter(Order.order_status=='PENDING').all()
+            pending = {row.id for row in rows}
+        else:
+            pending = {id for id, in session.query(Order.id).filter(Order.order_status=='PENDING')}
+            with self._lock:
+                new = pending - self._queued
+            rows = query.filter(Order.id.in_(new)).all() if new else []
+
+        weights = Order.SIZE_WEIGHTS
+        entries = [PendingOrder(self._rank(created_at.timestamp(),quantity * weights[pizza_size]),
+                                id,quantity * weights[pizza_size],created_at.timestamp())
+                   for id,quantity,pizza_size,created_at in rows]
+
+        with self._lock:
+            if full:
+                heapq.heapify(entries)
+                self._heap = entries
+                self._queued = pending
+            else:
+                # Orders no longer pending stay in the heap until plan() pops them
+                self._queued &= pending
+                for entry in entries:
+                    heapq.heappush(self._heap,entry)
+                    self._queued.add(entry.id)
+
+    def plan(self):
+        """
+        Takes the next batch of orders off the queue and packs them into runs.
+
+        Returns:
+          list: The runs, each a list of PendingOrder in queue order.
+        """
+        batch = []
+        with self._lock:
+            while self._heap and len(batch) < self.batch_size:
+                entry = heapq.heappop(self._heap)
+                if entry.id in self._queued:
+                    self._queued.discard(entry.id)
+                    batch.append(entry)
+
+        runs,open_runs = [],[]
+
+        for entry in batch:
+            for run in open_runs:
+                if run[0] + entry.load <= self.run_capacity:
+                    run[0] += entry.load
+                    run[1].append(entry)
+                    break
+            else:
+                run = [entry.load,[entry]]
+                runs.append(run[1])
+                open_runs.append(run)
+                if len(open_runs) > OPEN_RUNS:
+                    open_runs.pop(0)
+
+        return runs
+
+    def requeue(self,runs):
+        """
+        Puts the orders of runs that could not be dispatched back in the queue.
+
+        Args:
+          runs (list): Runs returned by plan().
+        """
+        with self._lock:
+            for run in runs:
+                for entry in run:
+                    heapq.heappush(self._heap,entry)
+                    self._queued.add(entry.id)
+
+    def dispatch(self,session,runs):
+        """
+        Moves every run to IN-TRANSIT, one transaction per run.
+
+        Orders that are no longer pending are left out of their run. If a
+        run fails, it and the runs after it go back in the queue before the
+        error is raised.
+
+        Args:
+          session (Session): The session to update the orders with.
+          runs (list): The runs returned by plan().
+
+        Returns:
+          list: The ids of the orders actually dispatched, per run.
+        """
+        dispatched = []
+        for index,run in enumerate(runs):
+            try:
+                results = transition_orders(session,[entry.id for entry in run],'IN-TRANSIT')
+            except Exception:
+                session.rollback()
+                self.requeue(runs[index:])
+                raise
+
+            ids = [id for id,result in results.items() if result == 'updated']
+            if ids:
+                dispatched.append(ids)
+        return dispatched
+
+    def tick(self):
+        """
+        Runs one scheduling round against the primary database.
+
+        Returns:
+          list: The ids of the orders dispatched, per run.
+        """
+        with Session(bind=engine) as session:
+            self.refresh(session,full=self._ticks % self.resync_ticks == 0)
+            self._ticks += 1
+            runs = self.dispatch(session,self.plan())
+            self.last_runs = runs
+            return runs
+
+    def snapshot(self,limit=50):
+        """
+        Returns the head of the in-memory queue.
+
+        Args:
+          limit (int, optional): The most orders to return.
+
+        Returns:
+          dict: The number of queued orders and the next ones to go out.
+        """
+        with self._lock:
+            head = heapq.nsmallest(limit,(entry for entry in self._heap if entry.id in self._queued))
+            queued = len(self._queued)
+
+        now = time.time()
+        return {
+            "queued":queued,
+            "last_runs":self.last_runs,
+            "next":[{"id":entry.id,
+                     "load":entry.load,
+                     "waiting_seconds":round(now - entry.created_at)}
+                    for entry in head],
+        }
+
+    def query(self,session,limit=50):
+        """
+        Returns the head of the queue straight from the database.
+
+        Ranks the pending orders the way the scheduler does, in a single
+        ORDER BY ... LIMIT query, for workers that do not run the scheduler
+        and so have no queue in memory.
+
+        Args:
+          session (Session): The session to read the orders with.
+          limit (int, optional): The most orders to return.
+
+        Returns:
+          dict: The same as snapshot().
+        """
+        codes = Order.__table__.c.pizza_size.type.codes
+        weight = case({codes.index(pizza_size):weight for pizza_size,weight in Order.SIZE_WEIGHTS.items()},
+                      value=type_coerce(Order.pizza_size,SmallInteger))
+        load = Order.quantity * weight
+
+        rows = (session.query(Order.id,load,Order.created_at,func.count().over())
+                       .filter(Order.order_status=='PENDING')
+                       .order_by(self._rank(func.extract('epoch',Order.created_at),load),Order.id)
+                       .limit(limit)
+                       .all())
+
+        now = time.time()
+        return {
+            "queued":rows[0][3] if rows else 0,
+            "last_runs":self.last_runs,
+            "next":[{"id":id,
+                     "load":float(load),
+                     "waiting_seconds":round(now - created_at.timestamp())}
+                    for id,load,created_at,_ in rows],
+        }
+
+    async def run_forever(self,tick_seconds=DISPATCH_TICK_SECONDS):
+        """
+        Ticks every `tick_seconds` seconds, forever.
+
+        A failed tick is logged and the next one runs as usual.
+
+        Args:
+          tick_seconds (float, optional): The seconds between two ticks.
+        """
+        self.running = True
+        try:
+            while True:
+                try:
+                    await asyncio.to_thread(self.tick)
+                except Exception:
+                    logger.exception("Dispatch tick failed")
+                await asyncio.sleep(tick_seconds)
+        finally:
+            self.running = False
+
+
+dispatch_scheduler = DispatchScheduler()
+
+
+dispatch_router = APIRouter(prefix='/dispatch',
+                            tags=['Dispatch'])
+
+
+@dispatch_router.get('/queue',status_code=status.HTTP_200_OK)
+def get_dispatch_queue(limit:int=50,Authorize:AuthJWT=Depends()):
+    """
+    Returns the dispatch queue.
+
+    Args:
+      limit (int, optional): The most queued orders to return.
+      Authorize (AuthJWT): The authorization token.
+
+    Returns:
+      dict: The number of queued orders, the runs of the latest tick and the
+      next orders to go out.
+
+    Raises:
+      HTTPException: If the token is invalid or the user is not a superuser.
+
+    Examples:
+      >>> get_dispatch_queue(10, Authorize)
+      {"queued":42, "last_runs":[[3, 7], [9]], "next":[{"id":12, "load":3.0, "waiting_seconds":95}, ...]}
+    """
+    try:
+        Authorize.jwt_required()
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid Token"
+        )
+
+    current_user = Authorize.get_jwt_subject()
+
+    with read_session(current_user) as session:
+        user= session.query(User).filter(User.username==current_user).first()
+
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid Token"
+            )
+
+        if not user.is_staff:
+            raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="You are not a Superuser"
+            )
+
+        if dispatch_scheduler.running:
+            return dispatch_scheduler.snapshot(limit)
+
+        # The scheduler runs in another worker, ask the database instead
+        return dispatch_scheduler.query(session,limit)
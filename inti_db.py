@@ -1,4 +1,5 @@
-from database import Base,engine
-from models import User,Order
+from database import engine
+from migrations import upgrade
 
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+if __name__ == '__main__':
+    upgrade(engine)
\ No newline at end of file
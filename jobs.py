@@ -0,0 +1,359 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+import uuid
+
+from fastapi import APIRouter,Depends,status
+from fastapi.exceptions import HTTPException
+from fastapi_jwt_auth import AuthJWT
+from sqlalchemy import func,or_
+
+from database import Session,engine
+from models import OutboxJob,User
+
+
+logger = logging.getLogger(__name__)
+
+# Number of asyncio workers running jobs concurrently
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS','4'))
+
+# Seconds between two polls of the outbox when nobody wakes the queue up
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL','1'))
+
+# Attempts after which a job is given up on and marked failed
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS','5'))
+
+# The n-th retry waits JOB_BACKOFF_BASE * 2 ** (n - 1) seconds, capped
+JOB_BACKOFF_BASE = float(os.environ.get('JOB_BACKOFF_BASE','1'))
+JOB_BACKOFF_MAX = float(os.environ.get('JOB_BACKOFF_MAX','300'))
+
+# Seconds a claimed job stays locked to its worker before anyone may retry it
+JOB_LEASE = float(os.environ.get('JOB_LEASE','60'))
+
+# The jobs each order event fans out to
+ORDER_EVENT_JOBS = {
+    'order_placed':('notification','kitchen_ticket','audit'),
+    'order_updated':('audit',),
+    'order_status_changed':('notification','audit'),
+    'order_deleted':('audit',),
+}
+
+handlers = {}
+
+
+def job_handler(kind):
+    """
+    Registers an async function as the handler for a kind of job.
+
+    Args:
+      kind (str): The kind of job the function handles.
+
+    Returns:
+      function: A decorator registering the function.
+
+    Examples:
+      >>> @job_handler("notification")
+      ... async def notify(payload):
+      ...     await send_push(payload["order_id"])
+    """
+    def register(function):
+        handlers[kind] = function
+        return function
+    return register
+
+
+def enqueue_order_event(session,event,order_ids,**details):
+    """
+    Adds the jobs for an order event to the outbox.
+
+    The jobs are only added to the session, they are written by the caller's
+    commit together with the order change itself.
+
+    Args:
+      session (Session): The session the order change is made in.
+      event (str): One of the keys of ORDER_EVENT_JOBS.
+      order_ids (list): The ids of the orders the event is about.
+      **details: Extra fields for the job payloads.
+    """
+    session.bulk_insert_mappings(OutboxJob,[
+        {"kind":kind,
+         "payload":json.dumps({"event":event,"order_id":order_id,**details})}
+        for order_id in order_ids
+        for kind in ORDER_EVENT_JOBS[event]
+    ])
+
+
+@job_handler('notification')
+async def send_notification(payload):
+    logger.info("Notifying customer about %s of order %s",payload["event"],payload["order_id"])
+
+
+@job_handler('kitchen_ticket')
+async def print_kitchen_ticket(payload):
+    logger.info("Printing kitchen ticket for order %s",payload["order_id"])
+
+
+@job_handler('audit')
+async def write_audit_record(payload):
+    logger.info("Audit: %s",payload)
+
+
+class JobQueue:
+    """
+    An in-process asyncio job queue fed from the outbox table.
+
+    A poller claims due jobs from the outbox under a lease and hands them to
+    a pool of workers. Finished jobs are deleted from the outbox, failed jobs
+    are retried with exponential backoff and jobs whose worker died are picked
+    up again once their lease runs out, all up to JOB_MAX_ATTEMPTS attempts.
+
+    Attributes:
+      workers (int): The number of concurrent workers.
+      poll_interval (float): The seconds between two polls when idle.
+      queue (asyncio.Queue): The claimed jobs waiting for a worker.
+
+    Examples:
+      >>> await job_queue.start()
+      >>> job_queue.wake()
+      >>> await job_queue.stop()
+    """
+
+    def __init__(self,workers=JOB_WORKERS,poll_interval=JOB_POLL_INTERVAL):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.queue = None
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        self.last_lag = 0.0
+        self._loop = None
+        self._wake = None
+        self._tasks = []
+
+    async def start(self):
+        """
+        Starts the poller and the workers on the running event loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self.queue = asyncio.Queue(maxsize=self.workers * 2)
+        self._tasks = [asyncio.create_task(self._poll())]
+        self._tasks += [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        Cancels the poller and the workers.
+
+        Jobs that were claimed but not finished are left running in the
+        outbox and get retried once their lease expires.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks,return_exceptions=True)
+        self._tasks = []
+
+    def wake(self):
+        """
+        Tells the poller new jobs were committed. Safe to call from any thread.
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _claim(self,limit):
+        now = datetime.datetime.utcnow()
+        token = uuid.uuid4().hex
+
+        with Session(bind=engine) as session:
+            # A job whose lease ran out on its last attempt probably took its
+            # worker down with it, trying it again would only do so again
+            session.query(OutboxJob).filter(OutboxJob.status=='running',
+                                            OutboxJob.locked_until<now,
+                                            OutboxJob.attempts>=JOB_MAX_ATTEMPTS).update({
+                OutboxJob.status:'failed',
+                OutboxJob.locked_until:None,
+                OutboxJob.last_error:'Lease expired on the last attempt',
+            },synchronize_session=False)
+
+            due = or_(
+                (OutboxJob.status=='pending') & (OutboxJob.available_at<=now),
+                (OutboxJob.status=='running') & (OutboxJob.locked_until<now),
+            ) & (OutboxJob.attempts<JOB_MAX_ATTEMPTS)
+            candidates = (session.query(OutboxJob.id)
+                                 .filter(due)
+                                 .order_by(OutboxJob.id)
+                                 .limit(limit)
+                                 .scalar_subquery())
+
+            session.query(OutboxJob).filter(OutboxJob.id.in_(candidates),due).update({
+                OutboxJob.status:'running',
+                OutboxJob.attempts:OutboxJob.attempts + 1,
+                OutboxJob.locked_until:now + datetime.timedelta(seconds=JOB_LEASE),
+                OutboxJob.claim_token:token,
+            },synchronize_session=False)
+            session.commit()
+
+            return (session.query(OutboxJob.id,OutboxJob.kind,OutboxJob.payload,
+                                  OutboxJob.attempts,OutboxJob.created_at)
+                           .filter(OutboxJob.claim_token==token)
+                           .order_by(OutboxJob.id)
+                           .all())
+
+    def _finish(self,job):
+        with Session(bind=engine) as session:
+            session.query(OutboxJob).filter(OutboxJob.id==job.id).delete(synchronize_session=False)
+            session.commit()
+
+    def _fail(self,job,error):
+        if job.attempts >= JOB_MAX_ATTEMPTS:
+            values = {OutboxJob.status:'failed'}
+        else:
+            backoff = min(JOB_BACKOFF_BASE * 2 ** (job.attempts - 1),JOB_BACKOFF_MAX)
+            values = {
+                OutboxJob.status:'pending',
+                OutboxJob.available_at:datetime.datetime.utcnow() + datetime.timedelta(seconds=backoff),
+            }
+
+        values[OutboxJob.locked_until] = None
+        values[OutboxJob.last_error] = repr(error)
+
+        with Session(bind=engine) as session:
+            session.query(OutboxJob).filter(OutboxJob.id==job.id).update(values,synchronize_session=False)
+            session.commit()
+
+        return values[OutboxJob.status]
+
+    async def _poll(self):
+        failures = 0
+        while True:
+            self._wake.clear()
+            try:
+                jobs = await asyncio.to_thread(self._claim,self.queue.maxsize)
+
+            except Exception:
+                # Keep polling once the database is back, backing off meanwhile
+                failures += 1
+                logger.exception("Claiming jobs failed")
+                await asyncio.sleep(min(self.poll_interval * 2 ** failures,JOB_BACKOFF_MAX))
+                continue
+
+            failures = 0
+
+            for job in jobs:
+                await self.queue.put(job)
+
+            if not jobs:
+                try:
+                    await asyncio.wait_for(self._wake.wait(),self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _run(self,job):
+        self.last_lag = (datetime.datetime.utcnow() - job.created_at).total_seconds()
+
+        try:
+            handler = handlers[job.kind]
+            await handler(json.loads(job.payload))
+
+        except Exception as error:
+            logger.exception("Job %s (%s) failed",job.id,job.kind)
+            outcome = await asyncio.to_thread(self._fail,job,error)
+            if outcome == 'failed':
+                self.failed += 1
+            else:
+                self.retried += 1
+
+        else:
+            await asyncio.to_thread(self._finish,job)
+            self.processed += 1
+
+    async def _work(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._run(job)
+
+            except Exception:
+                # The job stays claimed and is tried again once its lease expires
+                logger.exception("Recording the outcome of job %s (%s) failed",job.id,job.kind)
+
+            finally:
+                self.queue.task_done()
+
+    def metrics(self,session):
+        """
+        Returns queue depth and lag figures.
+
+        Args:
+          session (Session): The session to count outbox rows with.
+
+        Returns:
+          dict: The claimed jobs waiting for a worker, the pending, running
+          and failed outbox rows, the age of the oldest pending job, the lag of the latest
+          job started and the jobs processed, retried and failed by this
+          process.
+        """
+        outbox = dict(session.query(OutboxJob.status,func.count(OutboxJob.id))
+                             .filter(OutboxJob.status.in_(('pending','running','failed')))
+                             .group_by(OutboxJob.status).all())
+        oldest = (session.query(func.min(OutboxJob.created_at))
+                         .filter(OutboxJob.status.in_(('pending','running'))).scalar())
+
+        return {
+            "queue_depth":self.queue.qsize() if self.queue is not None else 0,
+            "outbox":outbox,
+            "oldest_pending_seconds":(datetime.datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+            "last_lag_seconds":self.last_lag,
+            "processed":self.processed,
+            "retried":self.retried,
+            "failed":self.failed,
+        }
+
+
+job_queue = JobQueue()
+
+
+jobs_router = APIRouter(prefix='/jobs',
+                        tags=['Jobs'])
+
+
+@jobs_router.get('/metrics',status_code=status.HTTP_200_OK)
+async def get_job_metrics(Authorize:AuthJWT=Depends()):
+    """
+    Returns the background job queue metrics.
+
+    Args:
+      Authorize (AuthJWT): The authorization token.
+
+    Returns:
+      dict: The queue depth, lag and job counts.
+
+    Raises:
+      HTTPException: If the token is invalid or the user is not a superuser.
+
+    Examples:
+      >>> get_job_metrics(Authorize)
+      {"queue_depth":0, "outbox":{"failed":2}, "oldest_pending_seconds":0.0, ...}
+    """
+    try:
+        Authorize.jwt_required()
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid Token"
+        )
+
+    current_user = Authorize.get_jwt_subject()
+
+    with Session(bind=engine) as session:
+        user= session.query(User).filter(User.username==current_user).first()
+
+        if user.is_staff:
+            return job_queue.metrics(session)
+
+    raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="You are not a Superuser"
+    )
@@ -1,13 +1,66 @@
-from fastapi import FastAPI
+from fastapi import FastAPI,status
+from fastapi.responses import JSONResponse
 from auth import auth_router
 from order import order_router
+from order_stats import reconcile_periodically,prime_order_stats
+from archive import archive_periodically
+from jobs import jobs_router,job_queue
+from dispatch import dispatch_router,dispatch_scheduler
+from menu import menu_router,menu,refresh_menu_periodically
+from compression import CompressionMiddleware
+from database import engine,warm_up
+from migrations import check_schema
 from fastapi_jwt_auth import AuthJWT
 from schemas import Settings
-import inspect, re
+from contextlib import asynccontextmanager
+import asyncio, inspect, os, re
 from fastapi.routing import APIRoute
 from fastapi.openapi.utils import get_openapi
 
-app=FastAPI()
+
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Gets the app ready to serve, runs it, then stops its background jobs.
+
+    Startup checks the schema version, warms up the connection pools, primes
+    the shared order stats unless another worker already did, loads the
+    menu and starts the background jobs; only then does /ready report the
+    app as ready. When server.py runs several
+    workers, only worker 0 reconciles the shared order stats, archives
+    orders and dispatches them, while every worker runs jobs and keeps its
+    own menu snapshot fresh.
+
+    Args:
+      app (FastAPI): The app being served.
+    """
+    await asyncio.to_thread(check_schema,engine)
+    await asyncio.to_thread(warm_up)
+    await asyncio.to_thread(prime_order_stats)
+    await asyncio.to_thread(menu.reload)
+
+    background_tasks = [asyncio.create_task(refresh_menu_periodically())]
+    if os.environ.get('WORKER_ID','0') == '0':
+        background_tasks.append(asyncio.create_task(reconcile_periodically()))
+        background_tasks.append(asyncio.create_task(archive_periodically()))
+        background_tasks.append(asyncio.create_task(dispatch_scheduler.run_forever()))
+    await job_queue.start()
+
+    app.state.ready = True
+
+    yield
+
+    app.state.ready = False
+
+    await job_queue.stop()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks,return_exceptions=True)
+
+
+app=FastAPI(lifespan=lifespan)
+app.state.ready = False
+app.add_middleware(CompressionMiddleware)
 
 def custom_openapi():
     if app.openapi_schema:
@@ -69,4 +122,25 @@ def get_config():
 
 app.include_router(auth_router)
 app.include_router(order_router)
+app.include_router(jobs_router)
+app.include_router(dispatch_router)
+app.include_router(menu_router)
+
+
+@app.get('/ready',tags=['Health'])
+async def ready():
+    """
+    Tells whether the app has finished warming up.
+
+    Returns:
+      JSONResponse: 200 once startup is done, 503 before that and while
+      shutting down.
+
+    Examples:
+      >>> ready()
+      {"ready":true}
+    """
+    if app.state.ready:
+        return {"ready":True}
+    return JSONResponse({"ready":False},status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
 
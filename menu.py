@@ -0,0 +1,409 @@
+import asyncio
+import heapq
+import itertools
+import multiprocessing
+import os
+import threading
+from types import MappingProxyType
+from typing import Mapping,NamedTuple
+
+from fastapi import APIRouter,Depends,status
+from fastapi.exceptions import HTTPException
+from fastapi_jwt_auth import AuthJWT
+from sqlalchemy import SmallInteger,func,select,type_coerce
+
+from database import Session,engine
+from models import MenuPrice,Order,OrderArchive,User
+from schemas import MenuPriceModel,PizzaSize
+
+# numpy, once _import_numpy() has run: False before, None if not installed
+numpy = False
+
+
+# Seconds between two checks for menu changes made by other workers
+MENU_REFRESH_INTERVAL = float(os.environ.get('MENU_REFRESH_INTERVAL','2'))
+
+# Seconds after which the menu is reloaded anyway, for changes made on other hosts
+MENU_RELOAD_INTERVAL = float(os.environ.get('MENU_RELOAD_INTERVAL','300'))
+
+
+def _import_numpy():
+    # Imported on first use, numpy is slow to import and only pricing many
+    # orders at once needs it
+    global numpy
+    if numpy is False:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+        numpy = module
+    return numpy
+
+
+class MenuSnapshot(NamedTuple):
+    """
+    An immutable copy of the menu prices.
+
+    Code pricing several orders takes one snapshot and uses it throughout,
+    so a price change landing halfway cannot mix old and new prices.
+
+    Attributes:
+      version (int): The catalogue version the snapshot was loaded at.
+      prices (Mapping): The read-only price of one pizza per size, in cents.
+      by_code (tuple): The same prices by stored pizza size code.
+
+    Examples:
+      >>> snapshot = MenuSnapshot.build(1, {"SMALL":899, "MEDIUM":1199, "LARGE":1499, "EXTRA-LARGE":1799})
+      >>> snapshot.total("LARGE", 2)
+      2998
+    """
+    version:int
+    prices:Mapping
+    by_code:tuple
+
+    @classmethod
+    def build(cls,version,prices):
+        """
+        Builds a snapshot from a price per pizza size.
+
+        Args:
+          version (int): The catalogue version the prices were loaded at.
+          prices (dict): The price of one pizza per size, in cents.
+
+        Returns:
+          MenuSnapshot: The snapshot.
+
+        Raises:
+          RuntimeError: If a pizza size has no price.
+        """
+        codes = Order.__table__.c.pizza_size.type.codes
+        missing = [code for code in codes if code not in prices]
+        if missing:
+            raise RuntimeError(f"The menu has no price for {missing}. Run inti_db.py to add the defaults.")
+
+        by_code = tuple(prices[code] for code in codes)
+
+        return cls(version,MappingProxyType({code:prices[code] for code in codes}),by_code)
+
+    def total(self,pizza_size,quantity):
+        """
+        Prices one order.
+
+        Args:
+          pizza_size (str): The size of the pizza in the order.
+          quantity (int): The quantity of pizzas in the order.
+
+        Returns:
+          int: The total of the order, in cents.
+        """
+        return self.prices[pizza_size] * quantity
+
+    def totals(self,size_codes,quantities):
+        """
+        Prices many orders at once.
+
+        With numpy installed this is a single gather and multiply over the
+        whole set; without it, a plain loop over the orders.
+
+        Args:
+          size_codes (sequence): The pizza size of every order, as the
+            SMALLINT code stored in the database.
+          quantities (sequence): The quantity of pizzas in every order.
+
+        Returns:
+          numpy.ndarray or list: The total of every order, in cents; a list
+          when numpy is not installed.
+
+        Examples:
+          >>> snapshot.totals([0, 2], [3, 1])
+          array([2697, 1499])
+        """
+        if _import_numpy() is not None:
+            by_code = numpy.asarray(self.by_code,dtype=numpy.int64)
+            return by_code[numpy.asarray(size_codes,dtype=numpy.intp)] * numpy.asarray(quantities,dtype=numpy.int64)
+
+        by_code = self.by_code
+        return [by_code[code] * quantity for code,quantity in zip(size_codes,quantities)]
+
+
+class MenuCatalogue:
+    """
+    Holds the current menu snapshot of a worker.
+
+    The snapshot is loaded once at startup and replaced whole when the menu
+    changes, a single reference swap, so readers never wait on a lock nor
+    see a half updated menu. Pricing an order never reads the database.
+    Orders keep the price they were placed at, so a price change only
+    applies to new orders.
+
+    A price change bumps a version counter kept in shared memory, so the
+    workers server.py forks notice it on their next refresh and reload.
+
+    Examples:
+      >>> menu.snapshot.total("SMALL", 3)
+      2697
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._version = multiprocessing.Value('q',0)
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.reload()
+        return snapshot
+
+    @property
+    def stale(self):
+        snapshot = self._snapshot
+        return snapshot is None or snapshot.version != self._version.value
+
+    def reload(self):
+        """
+        Loads the menu from the primary database and swaps it in.
+
+        A reload that started before a newer one finished is dropped, so the
+        snapshot never goes back to older prices.
+
+        Returns:
+          MenuSnapshot: The current snapshot.
+        """
+        version = self._version.value
+
+        with Session(bind=engine) as session:
+            prices = dict(session.query(MenuPrice.pizza_size,MenuPrice.price_cents).all())
+
+        snapshot = MenuSnapshot.build(version,prices)
+
+        with self._lock:
+            if self._snapshot is None or self._snapshot.version <= version:
+                self._snapshot = snapshot
+            return self._snapshot
+
+    def set_price(self,session,pizza_size,price_cents):
+        """
+        Changes the price of a pizza size and swaps in the new menu.
+
+        Args:
+          session (Session): The session to write the price with.
+          pizza_size (str): The size of pizza to price.
+          price_cents (int): The new price of one pizza, in cents.
+
+        Returns:
+          MenuSnapshot: The new snapshot.
+        """
+        menu_price = session.query(MenuPrice).filter(MenuPrice.pizza_size==pizza_size).first()
+
+        if menu_price is None:
+            menu_price = MenuPrice(pizza_size=pizza_size)
+            session.add(menu_price)
+
+        menu_price.price_cents = price_cents
+
+        session.commit()
+
+        with self._version.get_lock():
+            self._version.value += 1
+
+        return self.reload()
+
+
+menu = MenuCatalogue()
+
+
+async def refresh_menu_periodically(interval=MENU_REFRESH_INTERVAL,reload_interval=MENU_RELOAD_INTERVAL):
+    """
+    Reloads the menu whenever another worker changed it, forever.
+
+    The menu is also reloaded every `reload_interval` seconds regardless, to
+    pick up changes made through another host.
+
+    Args:
+      interval (float, optional): The seconds between two checks.
+      reload_interval (float, optional): The most seconds between two reloads.
+    """
+    since_reload = 0.0
+    while True:
+        await asyncio.sleep(interval)
+        since_reload += interval
+        if menu.stale or since_reload >= reload_interval:
+            await asyncio.to_thread(menu.reload)
+            since_reload = 0.0
+
+
+def _report_numpy(snapshot,groups,statuses,sizes,top):
+    data = numpy.fromiter(itertools.chain.from_iterable(groups),dtype=numpy.int64,count=6 * len(groups)).reshape(-1,6)
+    totals = snapshot.totals(data[:,1],data[:,2]) if snapshot is not None else data[:,5]
+
+    by_status = numpy.bincount(data[:,0],weights=totals,minlength=statuses)
+    by_size = numpy.bincount(data[:,1],weights=totals,minlength=sizes)
+
+    user_ids,per_group = numpy.unique(data[:,3],return_inverse=True)
+    by_user = numpy.bincount(per_group,weights=totals,minlength=len(user_ids))
+    best = numpy.argsort(-by_user,kind='stable')[:top]
+
+    # The sums are float64, exact for any total below 2 ** 53 cents
+    return ([round(total) for total in by_status.tolist()],
+            [round(total) for total in by_size.tolist()],
+            [(int(user_ids[index]),round(by_user[index])) for index in best])
+
+
+def _report_python(snapshot,groups,statuses,sizes,top):
+    by_status = [0] * statuses
+    by_size = [0] * sizes
+    by_user = {}
+    by_code = snapshot.by_code if snapshot is not None else None
+
+    for order_status,pizza_size,quantity,user_id,_,billed in groups:
+        total = by_code[pizza_size] * quantity if by_code is not None else billed
+        by_status[order_status] += total
+        by_size[pizza_size] += total
+        by_user[user_id] = by_user.get(user_id,0) + total
+
+    return by_status,by_size,heapq.nlargest(top,by_user.items(),key=lambda item:item[1])
+
+
+def order_report(session,snapshot=None,include_archived=False,top=10):
+    """
+    Adds up the value of every order.
+
+    The database only counts the orders and adds up their pizzas and what
+    was charged for them per order status, pizza size and user, reading the
+    stored SMALLINT codes as they are. Those groups are then summed all at
+    once, vectorized when numpy is installed. Orders are valued at the
+    prices they were placed at, or, given a snapshot, repriced at it.
+
+    Args:
+      session (Session): The session to read the orders with.
+      snapshot (MenuSnapshot, optional): The prices to value the orders at
+        instead of the ones they were placed at.
+      include_archived (bool, optional): Whether to also count archived orders.
+      top (int, optional): The number of best customers to list.
+
+    Returns:
+      dict: The number of orders, their total value, the value per order
+      status and per pizza size and the customers who spent the most, all
+      amounts in cents.
+
+    Examples:
+      >>> order_report(session, top=1)
+      {"orders":3, "total_cents":5095, "total_cents_by_status":{"PENDING":5095, ...}, ...}
+    """
+    groups = []
+    for model in (Order,OrderArchive) if include_archived else (Order,):
+        order_status = type_coerce(model.order_status,SmallInteger)
+        pizza_size = type_coerce(model.pizza_size,SmallInteger)
+        user_id = func.coalesce(model.user_id,0)
+
+        # Run on the connection, the ORM has no objects to build here
+        groups += session.connection().execute(
+            select(order_status,pizza_size,func.sum(model.quantity),user_id,func.count(model.id),
+                   func.sum(model.quantity * model.unit_price_cents))
+            .group_by(order_status,pizza_size,user_id)
+        ).all()
+
+    statuses = Order.__table__.c.order_status.type.codes
+    sizes = Order.__table__.c.pizza_size.type.codes
+
+    report = _report_numpy if _import_numpy() is not None else _report_python
+    by_status,by_size,best = report(snapshot,groups,len(statuses),len(sizes),top)
+
+    return {
+        "orders":sum(group[4] for group in groups),
+        "total_cents":sum(by_status),
+        "total_cents_by_status":dict(zip(statuses,by_status)),
+        "total_cents_by_size":dict(zip(sizes,by_size)),
+        "top_customers":[{"user_id":user_id,"total_cents":total} for user_id,total in best],
+    }
+
+
+menu_router = APIRouter(prefix='/menu',
+                        tags=['Menu'])
+
+
+@menu_router.get('/',status_code=status.HTTP_200_OK)
+async def get_menu(Authorize:AuthJWT=Depends()):
+    """
+    Returns the menu prices.
+
+    Args:
+      Authorize (AuthJWT): The authorization token.
+
+    Returns:
+      dict: The menu version and the price of one pizza per size, in cents.
+
+    Raises:
+      HTTPException: If the token is invalid.
+
+    Examples:
+      >>> get_menu(Authorize)
+      {"version":0, "prices":{"SMALL":899, "MEDIUM":1199, "LARGE":1499, "EXTRA-LARGE":1799}}
+    """
+    try:
+        Authorize.jwt_required()
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid Token"
+        )
+
+    snapshot = menu.snapshot
+
+    return {"version":snapshot.version,"prices":dict(snapshot.prices)}
+
+
+@menu_router.put('/{pizza_size}',status_code=status.HTTP_200_OK)
+def set_menu_price(pizza_size:PizzaSize,price:MenuPriceModel,Authorize:AuthJWT=Depends()):
+    """
+    Changes the price of a pizza size.
+
+    Every worker serves the new price within MENU_REFRESH_INTERVAL seconds.
+
+    Args:
+      pizza_size (str): The size of pizza to price.
+      price (MenuPriceModel): The new price.
+      Authorize (AuthJWT): The authorization token.
+
+    Returns:
+      dict: The new menu version and prices.
+
+    Raises:
+      HTTPException: If the token is invalid or the user is not a superuser.
+
+    Examples:
+      >>> set_menu_price("LARGE", price, Authorize)
+      {"version":1, "prices":{"SMALL":899, "MEDIUM":1199, "LARGE":1599, "EXTRA-LARGE":1799}}
+    """
+    try:
+        Authorize.jwt_required()
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid Token"
+        )
+
+    current_user = Authorize.get_jwt_subject()
+
+    with Session(bind=engine) as session:
+        user= session.query(User).filter(User.username==current_user).first()
+
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid Token"
+            )
+
+        if not user.is_staff:
+            raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="You are not a Superuser"
+            )
+
+        snapshot = menu.set_price(session,pizza_size,price.price_cents)
+
+    return {"version":snapshot.version,"prices":dict(snapshot.prices)}
@@ -0,0 +1,250 @@
+from sqlalchemy import (Column,DateTime,ForeignKey,Index,Integer,MetaData,SmallInteger,String,Table,
+                        Text,func,inspect,text)
+
+from database import Base
+from models import SchemaVersion
+
+
+# Migrations describe their tables as they were when the migration was
+# written, never through the models, which keep changing after it
+
+
+def _user_table(metadata):
+    # Just enough of User_Master for foreign keys to resolve
+    return Table('User_Master',metadata,Column('id',Integer,primary_key=True))
+
+
+def _add_order_timestamps(conn):
+    # SQLite cannot add a column defaulting to CURRENT_TIMESTAMP, so the
+    # columns are added empty, back-filled and only then constrained
+    for column in ('created_at','updated_at'):
+        conn.execute(text(f'ALTER TABLE "Order_Master" ADD COLUMN {column} TIMESTAMP'))
+        conn.execute(text(f'UPDATE "Order_Master" SET {column} = CURRENT_TIMESTAMP'))
+
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text(f'ALTER TABLE "Order_Master" ALTER COLUMN {column} SET DEFAULT now()'))
+            conn.execute(text(f'ALTER TABLE "Order_Master" ALTER COLUMN {column} SET NOT NULL'))
+
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_Order_Master_status_updated_at '
+                      'ON "Order_Master" (order_status, updated_at)'))
+
+    metadata = MetaData()
+    _user_table(metadata)
+    Table('Order_Archive',metadata,
+          Column('id',Integer,primary_key=True,autoincrement=False),
+          Column('quantity',Integer,nullable=False),
+          Column('order_status',String(255)),
+          Column('pizza_size',String(255)),
+          Column('user_id',Integer,ForeignKey('User_Master.id')),
+          Column('created_at',DateTime,primary_key=True),
+          Column('updated_at',DateTime,nullable=False),
+          Column('archived_at',DateTime,nullable=False,server_default=func.now()),
+          Index('ix_Order_Archive_user_id','user_id'),
+          postgresql_partition_by='RANGE (created_at)'
+          ).create(conn,checkfirst=True)
+
+
+def _add_job_outbox(conn):
+    metadata = MetaData()
+    Table('Job_Outbox',metadata,
+          Column('id',Integer,primary_key=True,autoincrement=True),
+          Column('kind',String(50),nullable=False),
+          Column('payload',Text,nullable=False),
+          Column('status',String(20),nullable=False),
+          Column('attempts',Integer,nullable=False),
+          Column('created_at',DateTime,nullable=False),
+          Column('available_at',DateTime,nullable=False),
+          Column('locked_until',DateTime),
+          Column('claim_token',String(32)),
+          Column('last_error',Text),
+          Index('ix_Job_Outbox_status_available_at','status','available_at'),
+          Index('ix_Job_Outbox_claim_token','claim_token'),
+          ).create(conn,checkfirst=True)
+
+
+# The choice codes as migration 3 stored them, by position
+CHOICE_CODES = {'order_status':('PENDING','IN-TRANSIT','DELIVERED'),
+                'pizza_size':('SMALL','MEDIUM','LARGE','EXTRA-LARGE')}
+
+# The code of the choice orders fall back to: PENDING and SMALL
+CHOICE_DEFAULTS = {'order_status':0,'pizza_size':0}
+
+
+def _choice_columns_to_small_int(conn):
+    # Add a SMALLINT column next to each string column, fill it from the
+    # string, then swap it in. Indexes on the old columns go first because
+    # SQLite refuses to drop an indexed column.
+    inspector = inspect(conn)
+    indexes = {'Order_Master':{'ix_Order_Master_status_updated_at':'order_status, updated_at'},
+               'Order_Archive':{}}
+
+    for table,table_indexes in indexes.items():
+        # Skip columns some earlier release already created as integers
+        types = {column['name']:column['type'] for column in inspector.get_columns(table)}
+        columns = [column for column in CHOICE_CODES if not isinstance(types[column],Integer)]
+        if not columns:
+            continue
+
+        for name in table_indexes:
+            conn.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+
+        for column in columns:
+            cases = ' '.join(f"WHEN '{code}' THEN {position}"
+                             for position,code in enumerate(CHOICE_CODES[column]))
+
+            conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column}_code SMALLINT'))
+            conn.execute(text(f'UPDATE "{table}" SET {column}_code = '
+                              f'CASE {column} {cases} ELSE {CHOICE_DEFAULTS[column]} END'))
+            conn.execute(text(f'ALTER TABLE "{table}" DROP COLUMN {column}'))
+            conn.execute(text(f'ALTER TABLE "{table}" RENAME COLUMN {column}_code TO {column}'))
+
+        for name,index_columns in table_indexes.items():
+            conn.execute(text(f'CREATE INDEX "{name}" ON "{table}" ({index_columns})'))
+
+
+def _choice_columns_not_null(conn):
+    # Earlier releases let NULL through, which the code now relies on never
+    # seeing. SQLite cannot add the constraint to an existing column.
+    for table in ('Order_Master','Order_Archive'):
+        for column,codes in CHOICE_CODES.items():
+            conn.execute(text(f'UPDATE "{table}" SET {column} = {CHOICE_DEFAULTS[column]} '
+                              f'WHERE {column} IS NULL OR {column} NOT BETWEEN 0 AND {len(codes) - 1}'))
+
+            if conn.dialect.name == 'postgresql':
+                conn.execute(text(f'ALTER TABLE "{table}" ALTER COLUMN {column} SET NOT NULL'))
+
+
+def _menu_price_table(metadata):
+    return Table('Menu_Price',metadata,
+                 Column('pizza_size',SmallInteger,primary_key=True,autoincrement=False),
+                 Column('price_cents',Integer,nullable=False),
+                 Column('updated_at',DateTime,nullable=False,server_default=func.now(),onupdate=func.now()))
+
+
+def _add_order_unit_prices(conn):
+    # Orders placed before prices were stored get today's menu price
+    for table in ('Order_Master','Order_Archive'):
+        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN unit_price_cents INTEGER'))
+        conn.execute(text(f'UPDATE "{table}" SET unit_price_cents = (SELECT price_cents FROM "Menu_Price" '
+                          f'WHERE "Menu_Price".pizza_size = "{table}".pizza_size)'))
+
+        if conn.dialect.name == 'postgresql':
+            conn.execute(text(f'ALTER TABLE "{table}" ALTER COLUMN unit_price_cents SET NOT NULL'))
+
+
+def _delete_finished_jobs(conn):
+    # Finished jobs used to be kept in the outbox as "done" forever
+    conn.execute(text('DELETE FROM "Job_Outbox" WHERE status = \'done\''))
+
+
+# The prices a new database starts with, in cents, by pizza size code
+DEFAULT_MENU_PRICES = {0:899,1:1199,2:1499,3:1799}
+
+
+def _seed_menu_prices(conn):
+    menu_price = _menu_price_table(MetaData())
+    priced = {row.pizza_size for row in conn.execute(menu_price.select())}
+    missing = [{"pizza_size":pizza_size,"price_cents":price_cents}
+               for pizza_size,price_cents in DEFAULT_MENU_PRICES.items()
+               if pizza_size not in priced]
+    if missing:
+        conn.execute(menu_price.insert(),missing)
+
+
+def _add_menu_prices(conn):
+    _menu_price_table(MetaData()).create(conn,checkfirst=True)
+    _seed_menu_prices(conn)
+
+
+# (version, description, step) in the order they have to be applied
+MIGRATIONS = [
+    (1,"Order created_at/updated_at and Order_Archive",_add_order_timestamps),
+    (2,"Job_Outbox",_add_job_outbox),
+    (3,"SMALLINT order_status/pizza_size",_choice_columns_to_small_int),
+    (4,"Menu_Price",_add_menu_prices),
+    (5,"NOT NULL order_status/pizza_size",_choice_columns_not_null),
+    (6,"Order unit_price_cents",_add_order_unit_prices),
+    (7,"Delete finished Job_Outbox rows",_delete_finished_jobs),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    """
+    Returns the schema version of a database.
+
+    Args:
+      conn (Connection): A connection to the database.
+
+    Returns:
+      int: The applied schema version, 0 for a database created before
+      versioning was introduced, or None for an empty database.
+    """
+    inspector = inspect(conn)
+    if not inspector.has_table(SchemaVersion.__tablename__):
+        return 0 if inspector.has_table('Order_Master') else None
+
+    version = conn.execute(text(f'SELECT max(version) FROM "{SchemaVersion.__tablename__}"')).scalar()
+    return version or 0
+
+
+def check_schema(bind):
+    """
+    Makes sure a database is at the latest schema version.
+
+    Args:
+      bind (Engine): The engine of the database to check.
+
+    Raises:
+      RuntimeError: If the database is empty or behind; run inti_db.py.
+    """
+    with bind.connect() as conn:
+        version = current_version(conn)
+
+    if version != LATEST_VERSION:
+        raise RuntimeError(f"Database schema is at version {version}, expected "
+                           f"{LATEST_VERSION}. Run inti_db.py to upgrade it.")
+
+
+def _stamp(conn,version):
+    conn.execute(SchemaVersion.__table__.delete())
+    conn.execute(SchemaVersion.__table__.insert().values(version=version))
+
+
+def upgrade(bind):
+    """
+    Brings a database up to the latest schema version.
+
+    An empty database gets the whole schema created at once, with the
+    default menu prices. Otherwise every migration newer than the recorded
+    version is applied in order.
+
+    Args:
+      bind (Engine): The engine of the database to upgrade.
+
+    Returns:
+      int: The schema version the database is at afterwards.
+
+    Examples:
+      >>> upgrade(engine)
+      7
+    """
+    with bind.begin() as conn:
+        version = current_version(conn)
+
+        if version is None:
+            Base.metadata.create_all(bind=conn)
+            _seed_menu_prices(conn)
+            _stamp(conn,LATEST_VERSION)
+            return LATEST_VERSION
+
+        SchemaVersion.__table__.create(conn,checkfirst=True)
+
+        for step_version,description,step in MIGRATIONS:
+            if step_version > version:
+                step(conn)
+                version = step_version
+
+        _stamp(conn,version)
+        return version
@@ -1,8 +1,52 @@
+import datetime
+
 from database import Base
-from sqlalchemy import Column,Integer,String,Boolean,Text,ForeignKey
-from sqlalchemy_utils import ChoiceType
+from sqlalchemy import Column,Integer,SmallInteger,String,Boolean,Text,ForeignKey,DateTime,Index,func
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.orm import relationship
 
+
+class ChoiceCode(TypeDecorator):
+    """
+    Stores one of a fixed set of choices as its position in the set.
+
+    The column holds a SMALLINT, while Python code reads and writes the
+    choice's code string. Loading a row hands back the very string object
+    from the choices tuple, so no per-row object is built. Choices may only
+    ever be appended, since a choice's position is what is stored.
+
+    Attributes:
+      choices (tuple): The (code, label) pairs, in storage order. Part of
+        the type's cache key, so statements compiled for one set of choices
+        are never reused for another.
+      codes (tuple): The choice codes, in storage order.
+
+    Examples:
+      >>> Column(ChoiceCode((('SMALL','small'),('LARGE','large'))))
+    """
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self,choices):
+        super().__init__()
+        self.choices = tuple(choices)
+        self.codes = tuple(code for code,_ in self.choices)
+        self._positions = {code:position for position,code in enumerate(self.codes)}
+
+    def process_bind_param(self,value,dialect):
+        if value is None:
+            return None
+        try:
+            return self._positions[value]
+        except KeyError:
+            raise ValueError(f"{value!r} is not one of {self.codes}") from None
+
+    def process_result_value(self,value,dialect):
+        if value is None:
+            return None
+        return self.codes[value]
+
+
 class User(Base):
     """
     Represents a user in the database.
@@ -35,14 +79,17 @@ class Order(Base):
       quantity (int): The quantity of pizzas in the order.
       order_status (str): The current status of the order.
       pizza_size (str): The size of the pizza in the order.
+      unit_price_cents (int): The menu price of one pizza when the order was placed, in cents.
       user_id (int): The id of the user who placed the order.
       user (User): The user who placed the order.
+      created_at (datetime): When the order was placed.
+      updated_at (datetime): When the order was last changed.
 
     Notes:
       The order_status and pizza_size attributes are set to default values if not specified.
 
     Examples:
-      >>> order = Order(quantity=2, user_id=1)
+      >>> order = Order(quantity=2, unit_price_cents=899, user_id=1)
       >>> order.pizza_size
       'SMALL'
       >>> order.order_status
@@ -56,6 +103,12 @@ class Order(Base):
         ('DELIVERED','delivered')
     )
 
+    # The status an order must be in to move to each status
+    STATUS_TRANSITIONS = {
+        'IN-TRANSIT':'PENDING',
+        'DELIVERED':'IN-TRANSIT'
+    }
+
     PIZZA_SIZES = (
         ('SMALL','small'),
         ('MEDIUM','medium'),
@@ -63,9 +116,136 @@ class Order(Base):
         ('EXTRA-LARGE','extra-large')
     )
 
+    # How much room one pizza of each size takes in a delivery run
+    SIZE_WEIGHTS = {
+        'SMALL':1.0,
+        'MEDIUM':1.5,
+        'LARGE':2.0,
+        'EXTRA-LARGE':2.5
+    }
+
     id = Column(Integer,primary_key=True,autoincrement=True)
     quantity = Column(Integer,nullable=False)
-    order_status = Column(ChoiceType(choices=ORDER_STATUSES),default="PENDING")
-    pizza_size = Column(ChoiceType(choices=PIZZA_SIZES),default="SMALL")
+    order_status = Column(ChoiceCode(ORDER_STATUSES),nullable=False,default="PENDING")
+    pizza_size = Column(ChoiceCode(PIZZA_SIZES),nullable=False,default="SMALL")
+    unit_price_cents = Column(Integer,nullable=False)
     user_id = Column(Integer,ForeignKey('User_Master.id'))
-    user = relationship('User',back_populates='orders')
\ No newline at end of file
+    created_at = Column(DateTime,nullable=False,server_default=func.now())
+    updated_at = Column(DateTime,nullable=False,server_default=func.now(),onupdate=func.now())
+    user = relationship('User',back_populates='orders')
+
+    __table_args__ = (
+        Index('ix_Order_Master_status_updated_at','order_status','updated_at'),
+    )
+
+
+class MenuPrice(Base):
+    """
+    Represents the price of one pizza size on the menu.
+
+    The whole table is loaded into memory by menu.py, so order totals never
+    read it per request.
+
+    Attributes:
+      pizza_size (str): The size of pizza the price is for.
+      price_cents (int): The price of one pizza, in cents.
+      updated_at (datetime): When the price was last changed.
+
+    Examples:
+      >>> MenuPrice(pizza_size="LARGE", price_cents=1499)
+    """
+    __tablename__ = 'Menu_Price'
+
+    pizza_size = Column(ChoiceCode(Order.PIZZA_SIZES),primary_key=True,autoincrement=False)
+    price_cents = Column(Integer,nullable=False)
+    updated_at = Column(DateTime,nullable=False,server_default=func.now(),onupdate=func.now())
+
+
+class OrderArchive(Base):
+    """
+    Represents an archived order in the database.
+
+    Delivered orders are moved here by the archival job so the hot
+    Order_Master table only holds orders that are still being worked on.
+    On PostgreSQL the table is range partitioned by created_at, one
+    partition per month.
+
+    Attributes:
+      id (int): The id the order had in Order_Master.
+      quantity (int): The quantity of pizzas in the order.
+      order_status (str): The status of the order when it was archived.
+      pizza_size (str): The size of the pizza in the order.
+      unit_price_cents (int): The menu price of one pizza when the order was placed, in cents.
+      user_id (int): The id of the user who placed the order.
+      created_at (datetime): When the order was placed.
+      updated_at (datetime): When the order was last changed.
+      archived_at (datetime): When the order was archived.
+    """
+    __tablename__ = 'Order_Archive'
+
+    id = Column(Integer,primary_key=True,autoincrement=False)
+    quantity = Column(Integer,nullable=False)
+    order_status = Column(ChoiceCode(Order.ORDER_STATUSES),nullable=False)
+    pizza_size = Column(ChoiceCode(Order.PIZZA_SIZES),nullable=False)
+    unit_price_cents = Column(Integer,nullable=False)
+    user_id = Column(Integer,ForeignKey('User_Master.id'))
+    created_at = Column(DateTime,primary_key=True)
+    updated_at = Column(DateTime,nullable=False)
+    archived_at = Column(DateTime,nullable=False,server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_Order_Archive_user_id','user_id'),
+        {'postgresql_partition_by':'RANGE (created_at)'},
+    )
+
+
+class OutboxJob(Base):
+    """
+    Represents a background job in the transactional outbox.
+
+    Jobs are written in the same transaction as the order change that
+    caused them and picked up by the workers in jobs.py, so a job is never
+    lost once its order change is committed.
+
+    Attributes:
+      id (int): The unique identifier for the job.
+      kind (str): The handler that runs the job.
+      payload (str): The job's arguments as JSON.
+      status (str): One of "pending", "running" or "failed". Finished jobs
+        are deleted.
+      attempts (int): How many times the job has been tried.
+      created_at (datetime): When the job was enqueued.
+      available_at (datetime): When the job may next be tried.
+      locked_until (datetime): When a running job's lease expires.
+      claim_token (str): The token of the worker that claimed the job.
+      last_error (str): The error of the latest failed attempt.
+    """
+    __tablename__ = 'Job_Outbox'
+
+    id = Column(Integer,primary_key=True,autoincrement=True)
+    kind = Column(String(50),nullable=False)
+    payload = Column(Text,nullable=False)
+    status = Column(String(20),nullable=False,default='pending')
+    attempts = Column(Integer,nullable=False,default=0)
+    created_at = Column(DateTime,nullable=False,default=datetime.datetime.utcnow)
+    available_at = Column(DateTime,nullable=False,default=datetime.datetime.utcnow)
+    locked_until = Column(DateTime)
+    claim_token = Column(String(32))
+    last_error = Column(Text)
+
+    __table_args__ = (
+        Index('ix_Job_Outbox_status_available_at','status','available_at'),
+        Index('ix_Job_Outbox_claim_token','claim_token'),
+    )
+
+
+class SchemaVersion(Base):
+    """
+    Records which migrations from migrations.py have been applied.
+
+    Attributes:
+      version (int): The schema version of the database.
+    """
+    __tablename__ = 'Schema_Version'
+
+    version = Column(Integer,primary_key=True,autoincrement=False)
\ No newline at end of file
@@ -1,9 +1,12 @@
 from fastapi import APIRouter,Depends,status
 from fastapi_jwt_auth import AuthJWT
 from fastapi.exceptions import HTTPException
-from models import User,Order
-from schemas import OrderModel,OrderStatusModel
-from database import engine,Session
+from models import User,Order,OrderArchive
+from schemas import OrderModel,PricedOrderModel,OrderStatusModel,OrderBatchStatusModel
+from database import engine,Session,read_session,router
+from order_stats import order_stats
+from jobs import enqueue_order_event,job_queue
+from menu import menu,order_report
 from fastapi.encoders import jsonable_encoder
 
 
@@ -12,6 +15,12 @@ order_router = APIRouter(prefix='/order',
 
 session = Session(bind=engine)
 
+
+def _with_totals(orders):
+    for order in orders:
+        order["total_cents"] = order["unit_price_cents"] * order["quantity"]
+    return orders
+
 @order_router.get('/')
 async def hello(Authorize:AuthJWT=Depends()):
     """
@@ -50,7 +59,8 @@ async def place_an_order(order:OrderModel,Authorize:AuthJWT=Depends()):
       Authorize (AuthJWT): The authorization token.
 
     Returns:
-      dict: The details of the order.
+      dict: The details of the order, with its total at the current menu
+      prices, which the order keeps from now on.
 
     Raises:
       HTTPException: If the token is invalid.
@@ -61,7 +71,9 @@ async def place_an_order(order:OrderModel,Authorize:AuthJWT=Depends()):
          "pizza_size":new_order.pizza_size,
          "quantity":new_order.quantity,
          "id":new_order.id,
-         "order_status":new_order.order_status 
+         "order_status":new_order.order_status,
+         "unit_price_cents":1499,
+         "total_cents":2998
       }
     """
     try:
@@ -79,35 +91,49 @@ async def place_an_order(order:OrderModel,Authorize:AuthJWT=Depends()):
 
     new_order = Order(
         pizza_size=order.pizza_size,
-        quantity = order.quantity
+        quantity = order.quantity,
+        unit_price_cents = menu.snapshot.prices[order.pizza_size]
     )
 
     new_order.user = user
 
     session.add(new_order)
 
+    session.flush()
+
+    enqueue_order_event(session,'order_placed',[new_order.id])
+
     session.commit()
 
+    job_queue.wake()
+
+    router.mark_write(current_user)
+
+    order_stats.add(new_order.order_status,new_order.pizza_size,new_order.quantity)
+
     response = {
        "pizza_size":new_order.pizza_size,
        "quantity":new_order.quantity,
        "id":new_order.id,
-       "order_status":new_order.order_status 
+       "order_status":new_order.order_status,
+       "unit_price_cents":new_order.unit_price_cents,
+       "total_cents":new_order.unit_price_cents * new_order.quantity
     }
 
     return jsonable_encoder(response)
 
 
 @order_router.get('/order',status_code=status.HTTP_200_OK)
-async def get_all_orders(Authorize:AuthJWT=Depends()):
+async def get_all_orders(include_archived:bool=False,Authorize:AuthJWT=Depends()):
     """
     Returns all orders.
 
     Args:
+      include_archived (bool, optional): Whether to also return archived orders.
       Authorize (AuthJWT): The authorization token.
 
     Returns:
-      list: A list of all orders.
+      list: A list of all orders, each with its total.
 
     Raises:
       HTTPException: If the token is invalid or the user is not a superuser.
@@ -127,18 +153,129 @@ async def get_all_orders(Authorize:AuthJWT=Depends()):
     
     current_user = Authorize.get_jwt_subject()
 
-    user= session.query(User).filter(User.username==current_user).first()
+    with read_session(current_user) as session:
+        user= session.query(User).filter(User.username==current_user).first()
 
-    if user.is_staff:
-        orders = session.query(Order).all()
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid Token"
+            )
 
-        return jsonable_encoder(orders)
+        if user.is_staff:
+            orders = session.query(Order).all()
+
+            if include_archived:
+                orders += session.query(OrderArchive).all()
+
+            return _with_totals(jsonable_encoder(orders))
     
     raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="You are not a Superuser"
     )
 
+@order_router.get('/stats',status_code=status.HTTP_200_OK)
+async def get_order_stats(Authorize:AuthJWT=Depends()):
+    """
+    Returns live order counts.
+
+    Args:
+      Authorize (AuthJWT): The authorization token.
+
+    Returns:
+      dict: The number of orders per status and per pizza size, the total
+      number of orders and the number of pizzas not delivered yet.
+
+    Raises:
+      HTTPException: If the token is invalid or the user is not a superuser.
+
+    Examples:
+      >>> get_order_stats(Authorize)
+      {"order_status":{"PENDING":3, ...}, "pizza_size":{"SMALL":1, ...}, "total_orders":3, "pizzas_in_flight":5}
+    """
+    try:
+        Authorize.jwt_required()
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid Token"
+        )
+
+    current_user = Authorize.get_jwt_subject()
+
+    with read_session(current_user) as session:
+        user= session.query(User).filter(User.username==current_user).first()
+
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid Token"
+            )
+
+    if user.is_staff:
+        return order_stats.snapshot()
+
+    raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="You are not a Superuser"
+    )
+
+@order_router.get('/report',status_code=status.HTTP_200_OK)
+def get_order_report(include_archived:bool=False,at_current_prices:bool=False,top:int=10,
+                     Authorize:AuthJWT=Depends()):
+    """
+    Returns the value of all orders.
+
+    Args:
+      include_archived (bool, optional): Whether to also count archived orders.
+      at_current_prices (bool, optional): Whether to value the orders at
+        today's menu instead of the prices they were placed at.
+      top (int, optional): The number of best customers to list.
+      Authorize (AuthJWT): The authorization token.
+
+    Returns:
+      dict: The number of orders, their total value, the value per order
+      status and per pizza size and the customers who spent the most, all
+      amounts in cents.
+
+    Raises:
+      HTTPException: If the token is invalid or the user is not a superuser.
+
+    Examples:
+      >>> get_order_report(False, False, 1, Authorize)
+      {"orders":3, "total_cents":5095, ..., "top_customers":[{"user_id":1, "total_cents":5095}]}
+    """
+    try:
+        Authorize.jwt_required()
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid Token"
+        )
+
+    current_user = Authorize.get_jwt_subject()
+
+    with read_session(current_user) as session:
+        user= session.query(User).filter(User.username==current_user).first()
+
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid Token"
+            )
+
+        if user.is_staff:
+            snapshot = menu.snapshot if at_current_prices else None
+            return order_report(session,snapshot,include_archived,top)
+
+    raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="You are not a Superuser"
+    )
+
 @order_router.get('/order/{id}',status_code=status.HTTP_200_OK)
 async def get_order_based_on_user_id(id:int,Authorize:AuthJWT=Depends()):
     """
@@ -169,12 +306,25 @@ async def get_order_based_on_user_id(id:int,Authorize:AuthJWT=Depends()):
     
     current_user = Authorize.get_jwt_subject()
 
-    user= session.query(User).filter(User.username==current_user).first()
+    with read_session(current_user) as session:
+        user= session.query(User).filter(User.username==current_user).first()
 
-    if user.is_staff:
-        orders = session.query(Order).filter(Order.id==id).first()
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid Token"
+            )
+
+        if user.is_staff:
+            orders = session.query(Order).filter(Order.id==id).first()
+
+            if orders is None:
+                orders = session.query(OrderArchive).filter(OrderArchive.id==id).first()
+
+            if orders is None:
+                return None
 
-        return jsonable_encoder(orders)
+            return _with_totals([jsonable_encoder(orders)])[0]
     
     raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -211,13 +361,23 @@ async def get_current_users_order(Authorize:AuthJWT=Depends()):
     
     current_user = Authorize.get_jwt_subject()
 
-    user= session.query(User).filter(User.username==current_user).first()
+    with read_session(current_user) as session:
+        user= session.query(User).filter(User.username==current_user).first()
+
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid Token"
+            )
+
+        orders = session.query(Order).filter(Order.user_id==user.id).first()
 
-    orders = session.query(Order).filter(Order.user_id==user.id).first()
+        if orders is None:
+            return None
 
-    return jsonable_encoder(orders)
+        return _with_totals([jsonable_encoder(orders)])[0]
 
-@order_router.get('/user/order/{id}',status_code=status.HTTP_200_OK,response_model=OrderModel)
+@order_router.get('/user/order/{id}',status_code=status.HTTP_200_OK,response_model=PricedOrderModel)
 def get_current_users_order(id:int,Authorize:AuthJWT=Depends()):
     """
     Returns the current user's order.
@@ -246,13 +406,20 @@ def get_current_users_order(id:int,Authorize:AuthJWT=Depends()):
     
     current_user = Authorize.get_jwt_subject()
 
-    user= session.query(User).filter(User.username==current_user).first()
+    with read_session(current_user) as session:
+        user= session.query(User).filter(User.username==current_user).first()
 
-    orders = user.orders
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid Token"
+            )
 
-    for order in orders:
-        if order.id == id:
-            return order
+        orders = user.orders
+
+        for order in orders:
+            if order.id == id:
+                return _with_totals([jsonable_encoder(order)])[0]
         
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                         detail="No order with this id found")
@@ -291,11 +458,26 @@ def update_order(id:int,order:OrderModel,Authorize:AuthJWT=Depends()):
 
     order_to_update = session.query(Order).filter(Order.id==id).first()
 
+    previous = (order_to_update.order_status,order_to_update.pizza_size,order_to_update.quantity)
+
+    # A different pizza is charged at today's price, the same one keeps its price
+    if order.pizza_size != order_to_update.pizza_size:
+        order_to_update.unit_price_cents = menu.snapshot.prices[order.pizza_size]
+
     order_to_update.quantity = order.quantity
     order_to_update.pizza_size = order.pizza_size
 
+    enqueue_order_event(session,'order_updated',[id])
+
     session.commit()
 
+    job_queue.wake()
+
+    router.mark_write(current_user)
+
+    order_stats.remove(*previous)
+    order_stats.add(order_to_update.order_status,order_to_update.pizza_size,order_to_update.quantity)
+
     return jsonable_encoder(order_to_update)
 
 
@@ -334,10 +516,22 @@ async def update_order_status(id:int,order:OrderStatusModel,Authorize:AuthJWT=De
 
     if user.is_staff:
         order_to_update = session.query(Order).filter(Order.id==id).first()
+
+        previous_status = order_to_update.order_status
+
         order_to_update.order_status = order.order_status
 
+        enqueue_order_event(session,'order_status_changed',[id],order_status=order.order_status)
+
         session.commit()
 
+        job_queue.wake()
+
+        router.mark_write(current_user)
+
+        order_stats.remove(previous_status,order_to_update.pizza_size,order_to_update.quantity)
+        order_stats.add(order_to_update.order_status,order_to_update.pizza_size,order_to_update.quantity)
+
         return jsonable_encoder(order_to_update)
     
     raise HTTPException(
@@ -345,6 +539,117 @@ async def update_order_status(id:int,order:OrderStatusModel,Authorize:AuthJWT=De
             detail="You are not a Superuser"
     )
 
+
+def transition_orders(session,ids,order_status):
+    """
+    Moves a batch of orders to a new status with a single UPDATE.
+
+    Only orders currently in the status that legally precedes the new one
+    (PENDING -> IN-TRANSIT -> DELIVERED) are changed, the check being part
+    of the UPDATE's WHERE clause.
+
+    Args:
+      session (Session): The session to update the orders with.
+      ids (list): The ids of the orders to update.
+      order_status (str): The new status for the orders.
+
+    Returns:
+      dict: The outcome for every id, one of "updated", "not_found" or
+      "illegal_transition".
+
+    Raises:
+      ValueError: If no status leads to the new one, e.g. PENDING.
+
+    Examples:
+      >>> transition_orders(session, [1, 2, 3], "IN-TRANSIT")
+      {1: "updated", 2: "illegal_transition", 3: "not_found"}
+    """
+    if order_status not in Order.STATUS_TRANSITIONS:
+        raise ValueError(f"Orders cannot be moved to {order_status!r}")
+
+    ids = list(dict.fromkeys(ids))
+    required_status = Order.STATUS_TRANSITIONS[order_status]
+
+    current = {row.id:row for row in
+               session.query(Order.id,Order.order_status,Order.pizza_size,Order.quantity)
+                      .filter(Order.id.in_(ids))
+                      .with_for_update()}
+
+    updated = [id for id in ids
+               if id in current and current[id].order_status == required_status]
+
+    if updated:
+        session.query(Order).filter(Order.id.in_(ids),
+                                    Order.order_status==required_status
+                                    ).update({Order.order_status:order_status},
+                                             synchronize_session=False)
+
+        enqueue_order_event(session,'order_status_changed',updated,order_status=order_status)
+
+    session.commit()
+
+    if updated:
+        job_queue.wake()
+
+    for id in updated:
+        row = current[id]
+        order_stats.remove(row.order_status,row.pizza_size,row.quantity)
+        order_stats.add(order_status,row.pizza_size,row.quantity)
+
+    updated = set(updated)
+    return {id:"updated" if id in updated else
+               "not_found" if id not in current else
+               "illegal_transition"
+            for id in ids}
+
+
+@order_router.patch('/order/status',status_code=status.HTTP_202_ACCEPTED)
+async def update_orders_status(batch:OrderBatchStatusModel,Authorize:AuthJWT=Depends()):
+    """
+    Updates the status of a batch of orders.
+
+    Args:
+      batch (OrderBatchStatusModel): The ids of the orders and their new status.
+      Authorize (AuthJWT): The authorization token.
+
+    Returns:
+      dict: The new status and the outcome for every id.
+
+    Raises:
+      HTTPException: If the token is invalid or the user is not a superuser.
+
+    Examples:
+      >>> update_orders_status(batch, Authorize)
+      {"order_status":"IN-TRANSIT", "results":[{"id":1, "result":"updated"}, ...]}
+    """
+    try:
+        Authorize.jwt_required()
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid Token"
+        )
+
+    current_user = Authorize.get_jwt_subject()
+
+    user= session.query(User).filter(User.username==current_user).first()
+
+    if not user.is_staff:
+        raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="You are not a Superuser"
+        )
+
+    results = transition_orders(session,batch.ids,batch.order_status)
+
+    router.mark_write(current_user)
+
+    return {
+        "order_status":batch.order_status,
+        "results":[{"id":id,"result":result} for id,result in results.items()]
+    }
+
 @order_router.delete('/order/delete/{id}/',status_code=status.HTTP_204_NO_CONTENT)
 async def delete_an_order(id:int,Authorize:AuthJWT=Depends()):
     """
@@ -370,13 +675,24 @@ async def delete_an_order(id:int,Authorize:AuthJWT=Depends()):
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail="Invalid Token")
 
+    current_user = Authorize.get_jwt_subject()
 
     order_to_delete=session.query(Order).filter(Order.id==id).first()
 
+    previous = (order_to_delete.order_status,order_to_delete.pizza_size,order_to_delete.quantity)
+
     session.delete(order_to_delete)
 
+    enqueue_order_event(session,'order_deleted',[id])
+
     session.commit()
 
+    job_queue.wake()
+
+    router.mark_write(current_user)
+
+    order_stats.remove(*previous)
+
     return order_to_delete
 
 
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+
+from sqlalchemy import func
+
+from database import Session,engine
+from models import Order
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two reconciliations of the counters against the database
+ORDER_STATS_RECONCILE_INTERVAL = float(os.environ.get('ORDER_STATS_RECONCILE_INTERVAL','60'))
+
+
+class OrderStats:
+    """
+    Live counts of orders kept in memory.
+
+    The counters are updated incrementally by the order routes and corrected
+    from time to time by reconcile(), which recounts with a GROUP BY. Reading
+    them never touches the database.
+
+    The counters live in one block of shared memory allocated at import, so
+    the workers server.py forks from the preloaded app all update and read
+    the same numbers. They are primed once, by whichever worker starts
+    first; workers started later, or restarted, leave them alone.
+
+    Attributes:
+      by_status (dict): The number of orders per order status.
+      by_size (dict): The number of orders per pizza size.
+      quantity_by_status (dict): The number of pizzas per order status.
+
+    Examples:
+      >>> stats = OrderStats()
+      >>> stats.add("PENDING", "SMALL", 2)
+      >>> stats.snapshot()["pizzas_in_flight"]
+      2
+    """
+
+    def __init__(self):
+        self._statuses = [code for code,_ in Order.ORDER_STATUSES]
+        self._sizes = [code for code,_ in Order.PIZZA_SIZES]
+
+        # Orders per status, then orders per size, then pizzas per status
+        self._status_slots = {code:slot for slot,code in enumerate(self._statuses)}
+        self._size_slots = {code:len(self._statuses) + slot for slot,code in enumerate(self._sizes)}
+        self._quantity_slots = {code:len(self._statuses) + len(self._sizes) + slot
+                                for slot,code in enumerate(self._statuses)}
+
+        self._counts = multiprocessing.RawArray('q',2 * len(self._statuses) + len(self._sizes))
+        self._lock = multiprocessing.Lock()
+        self._primed = multiprocessing.RawValue('b',0)
+        self._prime_lock = multiprocessing.Lock()
+
+    @property
+    def by_status(self):
+        return {code:self._counts[slot] for code,slot in self._status_slots.items()}
+
+    @property
+    def by_size(self):
+        return {code:self._counts[slot] for code,slot in self._size_slots.items()}
+
+    @property
+    def quantity_by_status(self):
+        return {code:self._counts[slot] for code,slot in self._quantity_slots.items()}
+
+    def _count(self,order_status,pizza_size,quantity,count):
+        self._counts[self._status_slots[order_status]] += count
+        self._counts[self._size_slots[pizza_size]] += count
+        self._counts[self._quantity_slots[order_status]] += quantity
+
+    def add(self,order_status,pizza_size,quantity,count=1):
+        """
+        Counts orders in.
+
+        Args:
+          order_status (str): The status of the orders.
+          pizza_size (str): The pizza size of the orders.
+          quantity (int): The total number of pizzas in the orders.
+          count (int, optional): The number of orders. Negative to remove.
+        """
+        with self._lock:
+            self._count(order_status,pizza_size,quantity,count)
+
+    def remove(self,order_status,pizza_size,quantity,count=1):
+        """
+        Counts orders out.
+
+        Args:
+          order_status (str): The status of the orders.
+          pizza_size (str): The pizza size of the orders.
+          quantity (int): The total number of pizzas in the orders.
+          count (int, optional): The number of orders.
+        """
+        self.add(order_status,pizza_size,-quantity,-count)
+
+    def reconcile(self,session):
+        """
+        Recounts every order with a single GROUP BY and replaces the counters.
+
+        Args:
+          session (Session): The session to count with.
+        """
+        rows = session.query(Order.order_status,
+                             Order.pizza_size,
+                             func.count(Order.id),
+                             func.coalesce(func.sum(Order.quantity),0)
+                             ).group_by(Order.order_status,Order.pizza_size).all()
+
+        with self._lock:
+            self._counts[:] = [0] * len(self._counts)
+            for order_status,pizza_size,count,quantity in rows:
+                self._count(order_status,pizza_size,quantity,count)
+            self._primed.value = 1
+
+    def prime(self,session):
+        """
+        Reconciles the counters unless they were already primed.
+
+        Args:
+          session (Session): The session to count with.
+
+        Returns:
+          bool: Whether this call primed the counters.
+        """
+        with self._prime_lock:
+            if self._primed.value:
+                return False
+            self.reconcile(session)
+            return True
+
+    def snapshot(self):
+        """
+        Returns the current counts.
+
+        Returns:
+          dict: The orders per status and per size, the total number of
+          orders and the number of pizzas not delivered yet.
+        """
+        with self._lock:
+            by_status = self.by_status
+            return {
+                "order_status":by_status,
+                "pizza_size":self.by_size,
+                "total_orders":sum(by_status.values()),
+                "pizzas_in_flight":sum(quantity for order_status,quantity
+                                       in self.quantity_by_status.items()
+                                       if order_status != 'DELIVERED')
+            }
+
+
+order_stats = OrderStats()
+
+
+def reconcile_order_stats():
+    """
+    Reconciles the shared counters against the primary database.
+    """
+    with Session(bind=engine) as session:
+        order_stats.reconcile(session)
+
+
+def prime_order_stats():
+    """
+    Primes the shared counters from the primary database, once for all workers.
+    """
+    with Session(bind=engine) as session:
+        order_stats.prime(session)
+
+
+async def reconcile_periodically(interval=ORDER_STATS_RECONCILE_INTERVAL):
+    """
+    Reconciles the shared counters every `interval` seconds, forever.
+
+    The counters are primed at startup, so the first run waits an interval.
+    A failed run is logged and tried again an interval later.
+
+    Args:
+      interval (float, optional): The number of seconds between two runs.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(reconcile_order_stats)
+        except Exception:
+            logger.exception("Reconciling the order stats failed")
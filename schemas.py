@@ -1,5 +1,11 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel,conint,conlist
+from typing import Literal,Optional
+
+OrderStatus = Literal['PENDING','IN-TRANSIT','DELIVERED']
+PizzaSize = Literal['SMALL','MEDIUM','LARGE','EXTRA-LARGE']
+
+# The statuses an order can be moved to, see Order.STATUS_TRANSITIONS
+TransitionStatus = Literal['IN-TRANSIT','DELIVERED']
 
 class SignupModel(BaseModel):
     """
@@ -141,8 +147,8 @@ class OrderModel(BaseModel):
     """
     id:Optional[int] = None
     quantity:int
-    order_status:Optional[str] = "PENDING"
-    pizza_size:Optional[str] = "SMALL"
+    order_status:OrderStatus = "PENDING"
+    pizza_size:PizzaSize = "SMALL"
     user_id:Optional[int] = None
 
     class Config:
@@ -170,6 +176,27 @@ class OrderModel(BaseModel):
             }
         }
 
+class PricedOrderModel(OrderModel):
+    """
+    Model for pizza orders returned with their price.
+
+    Attributes:
+      unit_price_cents (int, optional): The price of one pizza when the order was placed, in cents.
+      total_cents (int, optional): The total of the order, in cents.
+
+    Example:
+      >>> PricedOrderModel(
+      ...     quantity=2,
+      ...     pizza_size="LARGE",
+      ...     unit_price_cents=1499,
+      ...     total_cents=2998
+      ... )
+      PricedOrderModel(id=None, quantity=2, order_status='PENDING', pizza_size='LARGE', user_id=None, unit_price_cents=1499, total_cents=2998)
+    """
+    unit_price_cents:Optional[int] = None
+    total_cents:Optional[int] = None
+
+
 class OrderStatusModel(BaseModel):
     """
     Model for updating the status of an order.
@@ -187,7 +214,7 @@ class OrderStatusModel(BaseModel):
       ... )
       OrderStatusModel(order_status='PENDING')
     """
-    order_status:Optional[str] = "PENDING"
+    order_status:OrderStatus = "PENDING"
 
     class Config:
         """
@@ -210,3 +237,65 @@ class OrderStatusModel(BaseModel):
                 "order_status": "PENDING"
             }
         }
+
+
+class OrderBatchStatusModel(BaseModel):
+    """
+    Model for moving a batch of orders to a new status.
+
+    Attributes:
+      ids (list): The ids of the orders to update, at most 1000.
+      order_status (str): The new status for the orders, IN-TRANSIT or DELIVERED.
+
+    Config:
+      schema_extra (dict): Extra schema information for the model.
+
+    Example:
+      >>> OrderBatchStatusModel(
+      ...     ids=[1, 2, 3],
+      ...     order_status="IN-TRANSIT"
+      ... )
+      OrderBatchStatusModel(ids=[1, 2, 3], order_status='IN-TRANSIT')
+    """
+    ids:conlist(int,min_items=1,max_items=1000)
+    order_status:TransitionStatus
+
+    class Config:
+        """
+      schema_extra (dict): Extra schema information for the model.
+    """
+        schema_extra = {
+            "example": {
+                "ids": [1, 2, 3],
+                "order_status": "IN-TRANSIT"
+            }
+        }
+
+
+class MenuPriceModel(BaseModel):
+    """
+    Model for changing the price of a pizza size.
+
+    Attributes:
+      price_cents (int): The new price of one pizza, in cents.
+
+    Config:
+      schema_extra (dict): Extra schema information for the model.
+
+    Example:
+      >>> MenuPriceModel(
+      ...     price_cents=1499
+      ... )
+      MenuPriceModel(price_cents=1499)
+    """
+    price_cents:conint(gt=0)
+
+    class Config:
+        """
+      schema_extra (dict): Extra schema information for the model.
+    """
+        schema_extra = {
+            "example": {
+                "price_cents": 1499
+            }
+        }
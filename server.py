@@ -0,0 +1,235 @@
+"""
+Production launcher for the Pizza Delivery API.
+
+Imports the app once, binds the listening socket and forks WEB_CONCURRENCY
+uvicorn workers sharing both, so the preloaded code and the shared caches
+live in pages common to every worker. SIGTERM or SIGINT drains the workers
+gracefully; a worker that dies on its own is replaced, with a growing delay
+if it keeps dying. A worker that fails to start, e.g. because the schema is
+out of date, stops the whole server instead.
+
+    WEB_CONCURRENCY=8 DB_CONNECTION_BUDGET=80 python server.py
+"""
+import os
+import signal
+import socket
+import sys
+import time
+
+
+HOST = os.environ.get('HOST','0.0.0.0')
+PORT = int(os.environ.get('PORT','8000'))
+
+# Connections all workers together may open to each database
+DB_CONNECTION_BUDGET = int(os.environ.get('DB_CONNECTION_BUDGET','100'))
+
+# Connections a worker may use outside of its requests: the module level
+# sessions of auth.py and order.py keep theirs once used, the job poller and
+# the menu refresh each use one while they run, and so do worker 0's stats,
+# archive and dispatch loops
+WORKER_RESERVED_CONNECTIONS = 7
+
+# Connections every worker keeps for its requests, at the least
+MIN_REQUEST_CONNECTIONS = int(os.environ.get('MIN_REQUEST_CONNECTIONS','1'))
+
+MIN_POOL_SIZE_PER_WORKER = WORKER_RESERVED_CONNECTIONS + MIN_REQUEST_CONNECTIONS
+
+# Number of worker processes, by default one per CPU or as many as the
+# connection budget can give a full pool, whichever is fewer
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY',
+                                     max(1,min(os.cpu_count() or 1,
+                                               DB_CONNECTION_BUDGET // MIN_POOL_SIZE_PER_WORKER))))
+
+# Seconds a worker gets to finish in-flight requests before it is killed
+GRACEFUL_TIMEOUT = float(os.environ.get('GRACEFUL_TIMEOUT','30'))
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL','info')
+
+# Seconds before restarting a worker that died, doubled each time it dies
+# again within RESTART_RESET seconds of starting, up to RESTART_BACKOFF_MAX
+RESTART_BACKOFF = float(os.environ.get('RESTART_BACKOFF','0.5'))
+RESTART_BACKOFF_MAX = float(os.environ.get('RESTART_BACKOFF_MAX','30'))
+RESTART_RESET = float(os.environ.get('RESTART_RESET','60'))
+
+# Exit status of a worker whose startup failed
+WORKER_BOOT_ERROR = 3
+
+
+def pool_size_per_worker(budget,workers):
+    """
+    Splits a connection budget between workers.
+
+    Args:
+      budget (int): The connections all workers together may open.
+      workers (int): The number of workers.
+
+    Returns:
+      int: The pool size of each worker.
+
+    Raises:
+      ValueError: If the budget gives a worker fewer than
+        MIN_POOL_SIZE_PER_WORKER connections, which its background work and
+        module level sessions would exhaust.
+
+    Examples:
+      >>> pool_size_per_worker(100, 8)
+      12
+    """
+    pool_size = budget // workers
+    if pool_size < MIN_POOL_SIZE_PER_WORKER:
+        raise ValueError(f"DB_CONNECTION_BUDGET={budget} gives each of the {workers} workers "
+                         f"{pool_size} connections, fewer than the {MIN_POOL_SIZE_PER_WORKER} a worker "
+                         f"needs; raise it or lower WEB_CONCURRENCY")
+    return pool_size
+
+
+class Launcher:
+    """
+    Forks and supervises the uvicorn workers.
+
+    Attributes:
+      app (FastAPI): The preloaded app.
+      workers (int): The number of workers to keep running.
+      sock (socket): The listening socket shared by the workers.
+      children (dict): The worker id of every running worker, by pid.
+      exit_code (int): The status the launcher exits with.
+    """
+
+    def __init__(self,app,workers,sock):
+        self.app = app
+        self.workers = workers
+        self.sock = sock
+        self.children = {}
+        self.stopping = False
+        self.exit_code = 0
+        self._spawned_at = {}
+        self._failures = {}
+        self._restarts = {}
+
+    def spawn(self,worker_id):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = worker_id
+            self._spawned_at[worker_id] = time.monotonic()
+            return
+
+        # In the worker from here on
+        import uvicorn
+        from database import dispose_engines
+
+        signal.signal(signal.SIGTERM,signal.SIG_DFL)
+        signal.signal(signal.SIGINT,signal.SIG_DFL)
+        os.environ['WORKER_ID'] = str(worker_id)
+        dispose_engines()
+
+        config = uvicorn.Config(self.app,
+                                lifespan='on',
+                                log_level=LOG_LEVEL,
+                                timeout_graceful_shutdown=GRACEFUL_TIMEOUT)
+        server = uvicorn.Server(config)
+        server.run(sockets=[self.sock])
+        os._exit(0 if server.started else WORKER_BOOT_ERROR)
+
+    def stop(self,signum,frame):
+        self.stopping = True
+
+    def reap(self):
+        while self.children:
+            pid,wait_status = os.waitpid(-1,os.WNOHANG)
+            if pid == 0:
+                return
+            worker_id = self.children.pop(pid,None)
+            if worker_id is None or self.stopping:
+                continue
+
+            if os.waitstatus_to_exitcode(wait_status) == WORKER_BOOT_ERROR:
+                # Restarting would only fail the same way again
+                print(f"Worker {worker_id} (pid {pid}) failed to start, shutting down",file=sys.stderr)
+                self.stopping = True
+                self.exit_code = WORKER_BOOT_ERROR
+                continue
+
+            if time.monotonic() - self._spawned_at[worker_id] < RESTART_RESET:
+                self._failures[worker_id] = self._failures.get(worker_id,0) + 1
+            else:
+                self._failures[worker_id] = 0
+
+            failures = self._failures[worker_id]
+            delay = min(RESTART_BACKOFF * 2 ** (failures - 1),RESTART_BACKOFF_MAX) if failures else 0
+            print(f"Worker {worker_id} (pid {pid}) died, restarting it in {delay:g}s",file=sys.stderr)
+            self._restarts[worker_id] = time.monotonic() + delay
+
+    def restart(self):
+        now = time.monotonic()
+        for worker_id,due in list(self._restarts.items()):
+            if due <= now and not self.stopping:
+                del self._restarts[worker_id]
+                self.spawn(worker_id)
+
+    def drain(self):
+        for pid in self.children:
+            os.kill(pid,signal.SIGTERM)
+
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT + 5
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+
+        for pid in self.children:
+            try:
+                os.kill(pid,signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        """
+        Starts the workers and supervises them until SIGTERM or SIGINT.
+
+        Returns:
+          int: The exit status, WORKER_BOOT_ERROR if a worker failed to start.
+        """
+        signal.signal(signal.SIGTERM,self.stop)
+        signal.signal(signal.SIGINT,self.stop)
+
+        for worker_id in range(self.workers):
+            self.spawn(worker_id)
+
+        while not self.stopping:
+            self.reap()
+            self.restart()
+            time.sleep(0.5)
+
+        self.drain()
+        return self.exit_code
+
+
+def main():
+    """
+    Sizes the pools, preloads the app and runs the workers.
+    """
+    try:
+        pool_size = pool_size_per_worker(DB_CONNECTION_BUDGET,WEB_CONCURRENCY)
+    except ValueError as error:
+        sys.exit(str(error))
+
+    os.environ['DB_POOL_SIZE'] = str(pool_size)
+    os.environ['DB_MAX_OVERFLOW'] = '0'
+    os.environ.setdefault('DATABASE_ECHO','0')
+
+    # Preload before forking so the workers share the imported code pages
+    from main import app
+
+    sock = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+    sock.bind((HOST,PORT))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    print(f"Serving on {HOST}:{PORT} with {WEB_CONCURRENCY} workers, "
+          f"{pool_size} database connections each",file=sys.stderr)
+
+    sys.exit(Launcher(app,WEB_CONCURRENCY,sock).run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+# Configure the database before any application module creates its engine
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(),'pizza.db')
+os.environ['DATABASE_ECHO'] = '0'
+
+# Keep the dispatcher and the archiver from moving orders while a test looks at them
+os.environ['DISPATCH_TICK_SECONDS'] = '3600'
+os.environ['ARCHIVE_INTERVAL'] = '3600'
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def client():
+    from fastapi.testclient import TestClient
+
+    from database import engine
+    from main import app
+    from migrations import upgrade
+
+    upgrade(engine)
+
+    with TestClient(app) as client:
+        yield client
+
+
+def _headers(client,is_staff):
+    username = uuid.uuid4().hex[:20]
+    client.post('/auth/signup',json={"username":username,
+                                     "email":f"{username}@example.com",
+                                     "password":"password",
+                                     "is_staff":is_staff,
+                                     "is_active":True})
+    tokens = client.post('/auth/login',json={"username":username,"password":"password"}).json()
+    return {"Authorization":f"Bearer {tokens['access_token']}"}
+
+
+@pytest.fixture
+def staff_headers(client):
+    return _headers(client,True)
+
+
+@pytest.fixture
+def customer_headers(client):
+    return _headers(client,False)
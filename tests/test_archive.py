@@ -0,0 +1,53 @@
+import datetime
+
+import pytest
+
+from archive import archive_delivered_orders
+from database import Session,engine
+from models import Order,OrderArchive
+from order_stats import order_stats
+
+
+@pytest.fixture
+def delivered_orders(client):
+    long_ago = datetime.datetime.utcnow() - datetime.timedelta(days=90)
+    with Session(bind=engine) as session:
+        orders = [Order(quantity=2,pizza_size='LARGE',unit_price_cents=1499,order_status='DELIVERED',
+                        created_at=long_ago,updated_at=long_ago)
+                  for _ in range(3)]
+        session.add_all(orders)
+        session.commit()
+        ids = [order.id for order in orders]
+
+    order_stats.add('DELIVERED','LARGE',2 * len(ids),len(ids))
+    return ids
+
+
+def test_archiving_moves_old_delivered_orders(delivered_orders):
+    before = order_stats.snapshot()
+
+    assert archive_delivered_orders(older_than_days=30,batch_size=2) == len(delivered_orders)
+
+    with Session(bind=engine) as session:
+        assert session.query(Order).filter(Order.id.in_(delivered_orders)).count() == 0
+        assert session.query(OrderArchive).filter(OrderArchive.id.in_(delivered_orders)).count() == 3
+
+    after = order_stats.snapshot()
+    assert after["order_status"]["DELIVERED"] == before["order_status"]["DELIVERED"] - 3
+    assert after["pizza_size"]["LARGE"] == before["pizza_size"]["LARGE"] - 3
+
+
+def test_archived_orders_are_still_readable(client,staff_headers,delivered_orders):
+    archive_delivered_orders(older_than_days=30)
+
+    listed = client.get('/order/order',headers=staff_headers).json()
+    assert not {order["id"] for order in listed} & set(delivered_orders)
+
+    listed = client.get('/order/order?include_archived=true',headers=staff_headers).json()
+    archived = {order["id"]:order for order in listed if order["id"] in delivered_orders}
+    assert set(archived) == set(delivered_orders)
+    assert all(order["total_cents"] == 2 * 1499 for order in archived.values())
+
+    order = client.get(f'/order/order/{delivered_orders[0]}',headers=staff_headers).json()
+    assert order["id"] == delivered_orders[0]
+    assert order["order_status"] == "DELIVERED"
@@ -0,0 +1,74 @@
+import time
+import uuid
+
+from database import ReplicaRouter,Session,engine,router
+from models import User
+
+
+def _signup(client):
+    username = uuid.uuid4().hex[:20]
+    response = client.post('/auth/signup',json={"username":username,
+                                                "email":f"{username}@example.com",
+                                                "password":"password",
+                                                "is_staff":False,
+                                                "is_active":True})
+    assert response.status_code == 201
+    return username
+
+
+def test_signup_pins_the_new_user_to_the_primary(client,monkeypatch):
+    monkeypatch.setattr(router,'replicas',[object()])
+
+    username = _signup(client)
+
+    assert router.read_engine(username) is router.primary
+
+
+def test_reads_for_an_unknown_user_are_unauthorized(client):
+    username = _signup(client)
+    tokens = client.post('/auth/login',json={"username":username,"password":"password"}).json()
+    headers = {"Authorization":f"Bearer {tokens['access_token']}"}
+
+    # As a replica that has not received the new user yet would answer
+    with Session(bind=engine) as session:
+        session.query(User).filter(User.username==username).delete()
+        session.commit()
+
+    for path in ('/order/user/order','/order/order','/order/stats','/dispatch/queue'):
+        assert client.get(path,headers=headers).status_code == 401
+    assert client.put('/menu/SMALL',json={"price_cents":899},headers=headers).status_code == 401
+
+
+def _replicas(tmp_path):
+    from database import _create_engine
+
+    return [_create_engine(f"sqlite:///{tmp_path / name}") for name in ('replica1.db','replica2.db')]
+
+
+def test_round_robin_alternates_between_replicas(tmp_path):
+    first,second = _replicas(tmp_path)
+    replicas = ReplicaRouter(engine,[first,second],strategy='round_robin')
+
+    assert [replicas.read_engine() for _ in range(4)] == [first,second,first,second]
+
+
+def test_least_connections_picks_the_less_busy_replica(tmp_path):
+    first,second = _replicas(tmp_path)
+    replicas = ReplicaRouter(engine,[first,second],strategy='least_connections')
+
+    with first.connect():
+        assert replicas.read_engine() is second
+    with second.connect():
+        assert replicas.read_engine() is first
+
+
+def test_reads_return_to_the_replicas_after_the_window(tmp_path):
+    first,second = _replicas(tmp_path)
+    replicas = ReplicaRouter(engine,[first,second],window=0.05)
+
+    replicas.mark_write("johndoe")
+    assert replicas.read_engine("johndoe") is engine
+    assert replicas.read_engine("janedoe") in (first,second)
+
+    time.sleep(0.1)
+    assert replicas.read_engine("johndoe") in (first,second)
@@ -0,0 +1,106 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+
+import compression
+from compression import CompressionMiddleware,_choose_encoding
+
+
+def _app(*chunks,headers=()):
+    async def app(scope,receive,send):
+        await send({'type':'http.response.start','status':200,'headers':list(headers)})
+        for i,chunk in enumerate(chunks):
+            await send({'type':'http.response.body','body':chunk,'more_body':i < len(chunks) - 1})
+    return app
+
+
+def _call(app,accept_encoding,**options):
+    scope = {'type':'http','headers':[(b'accept-encoding',accept_encoding.encode())]}
+    sent = []
+
+    async def receive():
+        return {'type':'http.request'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(CompressionMiddleware(app,**options)(scope,receive,send))
+    return dict(sent[0]['headers']),[message['body'] for message in sent[1:]]
+
+
+@pytest.mark.parametrize('accept_encoding,offered,chosen',[
+    ('gzip',('br','gzip'),'gzip'),
+    ('gzip, br',('br','gzip'),'br'),
+    ('br;q=0.1, gzip',('br','gzip'),'gzip'),
+    ('br, gzip;q=0',('gzip',),None),
+    ('gzip;q=0',('br','gzip'),None),
+    ('*',('br','gzip'),'br'),
+    ('*, br;q=0',('br','gzip'),'gzip'),
+    ('identity',('br','gzip'),None),
+])
+def test_the_clients_preferred_encoding_wins(accept_encoding,offered,chosen):
+    scope = {'type':'http','headers':[(b'accept-encoding',accept_encoding.encode())]}
+    assert _choose_encoding(scope,offered) == chosen
+
+
+def test_small_bodies_are_sent_as_they_are():
+    headers,bodies = _call(_app(b'x' * 99),'gzip',minimum_size=100)
+
+    assert b'content-encoding' not in headers
+    assert bodies == [b'x' * 99]
+
+
+def test_large_bodies_are_compressed(monkeypatch):
+    monkeypatch.setattr(compression,'brotli',None)
+    body = b'pizza ' * 1000
+
+    headers,bodies = _call(_app(body,headers=[(b'content-length',str(len(body)).encode()),
+                                              (b'vary',b'Cookie')]),'gzip',minimum_size=100)
+
+    assert headers[b'content-encoding'] == b'gzip'
+    assert headers[b'vary'] == b'Cookie, Accept-Encoding'
+    assert headers[b'content-length'] == str(len(bodies[0])).encode()
+    assert gzip.decompress(bodies[0]) == body
+
+
+def test_refused_encodings_are_not_used():
+    headers,bodies = _call(_app(b'x' * 5000),'gzip;q=0',minimum_size=100)
+
+    assert b'content-encoding' not in headers
+    assert bodies == [b'x' * 5000]
+
+
+def test_streams_are_compressed_chunk_by_chunk(monkeypatch):
+    monkeypatch.setattr(compression,'brotli',None)
+    chunks = [b'first chunk ' * 10,b'second chunk ' * 10,b'last chunk']
+
+    headers,bodies = _call(_app(*chunks),'gzip',minimum_size=100)
+
+    assert headers[b'content-encoding'] == b'gzip'
+    assert b'content-length' not in headers
+
+    # Every chunk decodes as soon as it arrives
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    assert [decompressor.decompress(body) for body in bodies] == chunks
+    assert decompressor.eof
+
+
+def test_encoded_responses_pass_through():
+    body = b'already compressed' * 100
+    headers,bodies = _call(_app(body,headers=[(b'content-encoding',b'identity')]),'gzip',minimum_size=100)
+
+    assert headers == {b'content-encoding':b'identity'}
+    assert bodies == [body]
+
+
+def test_brotli_streams_decode_chunk_by_chunk():
+    brotli = pytest.importorskip('brotli')
+    chunks = [b'first chunk ' * 10,b'second chunk ' * 10,b'last chunk']
+
+    headers,bodies = _call(_app(*chunks),'gzip, br',minimum_size=100)
+
+    assert headers[b'content-encoding'] == b'br'
+    decompressor = brotli.Decompressor()
+    assert [decompressor.process(body) for body in bodies] == chunks
@@ -0,0 +1,93 @@
+import datetime
+
+import pytest
+from sqlalchemy import func
+
+from database import Session,engine
+from dispatch import DispatchScheduler
+from models import Order
+
+
+@pytest.fixture
+def pending_orders(client):
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    with Session(bind=engine) as session:
+        session.query(Order).filter(Order.order_status=='PENDING').update(
+            {Order.order_status:'DELIVERED'},synchronize_session=False)
+        orders = [Order(quantity=quantity,pizza_size=pizza_size,unit_price_cents=899,order_status='PENDING',
+                        created_at=now - datetime.timedelta(seconds=age),updated_at=now)
+                  for quantity,pizza_size,age in ((1,'SMALL',100),(4,'LARGE',50),(2,'MEDIUM',300),(1,'SMALL',10))]
+        session.add_all(orders)
+        session.commit()
+        return [order.id for order in orders]
+
+
+def test_database_queue_matches_the_in_memory_queue(pending_orders):
+    scheduler = DispatchScheduler(batch_size=10)
+    with Session(bind=engine) as session:
+        scheduler.refresh(session,full=True)
+        from_memory = scheduler.snapshot(limit=3)
+        from_database = scheduler.query(session,limit=3)
+
+    assert from_database["queued"] == from_memory["queued"] == 4
+    assert [entry["id"] for entry in from_database["next"]] == [entry["id"] for entry in from_memory["next"]]
+    assert [entry["load"] for entry in from_database["next"]] == [entry["load"] for entry in from_memory["next"]]
+
+
+def test_last_runs_are_shared(pending_orders):
+    scheduler = DispatchScheduler(run_capacity=5,batch_size=10)
+    runs = scheduler.tick()
+
+    assert sorted(id for run in runs for id in run) == sorted(pending_orders)
+    assert scheduler.last_runs == runs
+
+
+def test_a_failed_dispatch_requeues_its_orders(pending_orders,monkeypatch):
+    import dispatch
+
+    def failing_transition(session,ids,order_status):
+        raise RuntimeError("database unavailable")
+
+    scheduler = DispatchScheduler(batch_size=10)
+    with Session(bind=engine) as session:
+        scheduler.refresh(session,full=True)
+        monkeypatch.setattr(dispatch,'transition_orders',failing_transition)
+
+        with pytest.raises(RuntimeError):
+            scheduler.dispatch(session,scheduler.plan())
+
+    assert len(scheduler) == 4
+
+
+def _add_pending(session,id):
+    session.add(Order(id=id,quantity=1,pizza_size='SMALL',unit_price_cents=899,order_status='PENDING'))
+    session.commit()
+
+
+def test_refresh_picks_up_orders_committed_out_of_id_order(pending_orders):
+    scheduler = DispatchScheduler(batch_size=10)
+    with Session(bind=engine) as session:
+        highest = session.query(func.max(Order.id)).scalar()
+        _add_pending(session,highest + 1000)
+        scheduler.refresh(session,full=True)
+
+        # A lower id committing after a higher one, as concurrent inserts can
+        _add_pending(session,highest + 500)
+        scheduler.refresh(session)
+
+        assert len(scheduler) == 6
+        assert highest + 500 in [entry.id for run in scheduler.plan() for entry in run]
+
+
+def test_refresh_forgets_orders_no_longer_pending(pending_orders):
+    scheduler = DispatchScheduler(batch_size=10)
+    with Session(bind=engine) as session:
+        scheduler.refresh(session,full=True)
+        session.query(Order).filter(Order.id==pending_orders[0]).update(
+            {Order.order_status:'DELIVERED'},synchronize_session=False)
+        session.commit()
+        scheduler.refresh(session)
+
+    assert len(scheduler) == 3
+    assert pending_orders[0] not in [entry["id"] for entry in scheduler.snapshot()["next"]]
+    assert pending_orders[0] not in [entry.id for run in scheduler.plan() for entry in run]
@@ -0,0 +1,88 @@
+import asyncio
+import datetime
+import json
+import threading
+import time
+
+import jobs
+from database import Session,engine
+from models import OutboxJob
+
+HANDLER_SECONDS = 1.0
+
+
+def test_placing_an_order_does_not_wait_for_its_jobs(client,staff_headers,monkeypatch):
+    handled = threading.Event()
+
+    async def slow_kitchen_ticket(payload):
+        await asyncio.sleep(HANDLER_SECONDS)
+        handled.set()
+
+    monkeypatch.setitem(jobs.handlers,'kitchen_ticket',slow_kitchen_ticket)
+
+    start = time.perf_counter()
+    response = client.post('/order/order',json={"quantity":1,"pizza_size":"SMALL"},headers=staff_headers)
+    elapsed = time.perf_counter() - start
+
+    assert response.status_code == 201
+    assert elapsed < HANDLER_SECONDS / 4
+
+    # The job still runs, after the response went out
+    assert handled.wait(HANDLER_SECONDS * 5)
+
+
+def test_failed_claims_do_not_stop_the_poller(client,monkeypatch):
+    claims = []
+    claim = jobs.job_queue._claim
+
+    def flaky_claim(limit):
+        claims.append(limit)
+        if len(claims) == 1:
+            raise RuntimeError("database unavailable")
+        return claim(limit)
+
+    monkeypatch.setattr(jobs.job_queue,'_claim',flaky_claim)
+    jobs.job_queue.wake()
+
+    deadline = time.monotonic() + 5
+    while len(claims) < 2 and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert len(claims) >= 2
+
+
+def _outbox_row(id):
+    with Session(bind=engine) as session:
+        return session.query(OutboxJob.status,OutboxJob.last_error).filter(OutboxJob.id==id).first()
+
+
+def test_finished_jobs_leave_the_outbox(client,staff_headers):
+    with Session(bind=engine) as session:
+        job = OutboxJob(kind='audit',payload=json.dumps({"event":"order_updated","order_id":0}))
+        session.add(job)
+        session.commit()
+        id = job.id
+    jobs.job_queue.wake()
+
+    deadline = time.monotonic() + 5
+    while _outbox_row(id) is not None and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert _outbox_row(id) is None
+    outbox = client.get('/jobs/metrics',headers=staff_headers).json()["outbox"]
+    assert set(outbox) <= {'pending','running','failed'}
+
+
+def test_jobs_killing_their_worker_are_given_up_on(client):
+    expired = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    with Session(bind=engine) as session:
+        job = OutboxJob(kind='audit',payload='{}',status='running',attempts=jobs.JOB_MAX_ATTEMPTS,
+                        locked_until=expired,claim_token='0' * 32)
+        session.add(job)
+        session.commit()
+        id = job.id
+
+    claimed = jobs.JobQueue()._claim(100)
+
+    assert id not in [job.id for job in claimed]
+    assert _outbox_row(id) == ('failed','Lease expired on the last attempt')
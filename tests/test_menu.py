@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+import menu
+
+
+def test_importing_the_app_does_not_import_numpy():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable,'-c',"import sys, main; print('numpy' in sys.modules)"],
+                            cwd=root,env=os.environ,capture_output=True,text=True,check=True)
+
+    assert result.stdout.strip() == 'False'
+
+
+def test_reports_match_with_and_without_numpy(client,staff_headers,monkeypatch):
+    client.post('/order/order',json={"quantity":3,"pizza_size":"LARGE"},headers=staff_headers)
+
+    with_numpy = client.get('/order/report?at_current_prices=true',headers=staff_headers).json()
+    monkeypatch.setattr(menu,'numpy',None)
+    without_numpy = client.get('/order/report?at_current_prices=true',headers=staff_headers).json()
+
+    assert with_numpy == without_numpy
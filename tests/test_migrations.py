@@ -0,0 +1,63 @@
+from sqlalchemy import Integer,create_engine,inspect,text
+from sqlalchemy.orm import Session
+
+from migrations import CHOICE_CODES,LATEST_VERSION,current_version,upgrade
+from models import Order
+
+BASELINE = (
+    'CREATE TABLE "User_Master" (id INTEGER PRIMARY KEY, username VARCHAR(25) NOT NULL UNIQUE, '
+    'email VARCHAR(255) NOT NULL UNIQUE, password TEXT NOT NULL, is_active BOOLEAN, is_staff BOOLEAN)',
+    'CREATE TABLE "Order_Master" (id INTEGER PRIMARY KEY, quantity INTEGER NOT NULL, '
+    'order_status VARCHAR(255), pizza_size VARCHAR(255), user_id INTEGER REFERENCES "User_Master" (id))',
+)
+
+
+def _columns(engine):
+    inspector = inspect(engine)
+    return {table:{column['name'] for column in inspector.get_columns(table)}
+            for table in inspector.get_table_names()}
+
+
+def test_upgrade_from_the_baseline_schema_keeps_orders(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    with engine.begin() as conn:
+        for statement in BASELINE:
+            conn.execute(text(statement))
+        conn.execute(text('INSERT INTO "User_Master" VALUES (1, \'bob\', \'bob@example.com\', \'x\', 1, 1)'))
+        conn.execute(text('INSERT INTO "Order_Master" VALUES (1, 2, \'DELIVERED\', \'LARGE\', 1), '
+                          '(2, 1, NULL, \'HUGE\', 1)'))
+
+    with engine.connect() as conn:
+        assert current_version(conn) == 0
+
+    assert upgrade(engine) == LATEST_VERSION
+
+    with Session(bind=engine) as session:
+        orders = {order.id:(order.order_status,order.pizza_size,order.unit_price_cents)
+                  for order in session.query(Order)}
+    assert orders == {1:('DELIVERED','LARGE',1499),2:('PENDING','SMALL',899)}
+
+    inspector = inspect(engine)
+    for table in ('Order_Master','Order_Archive'):
+        types = {column['name']:column['type'] for column in inspector.get_columns(table)}
+        assert isinstance(types['order_status'],Integer)
+        assert isinstance(types['pizza_size'],Integer)
+
+
+def test_migrations_end_at_the_schema_of_the_models(tmp_path):
+    fresh = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    migrated = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+
+    upgrade(fresh)
+    with migrated.begin() as conn:
+        for statement in BASELINE:
+            conn.execute(text(statement))
+    upgrade(migrated)
+
+    assert _columns(migrated) == _columns(fresh)
+
+
+def test_frozen_choice_codes_are_a_prefix_of_the_models():
+    # Choices may only be appended, migrated codes keep their positions
+    for column,codes in CHOICE_CODES.items():
+        assert Order.__table__.c[column].type.codes[:len(codes)] == codes
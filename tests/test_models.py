@@ -0,0 +1,13 @@
+from sqlalchemy import create_engine,literal,select
+
+from models import Order
+
+
+def test_choice_types_do_not_share_compiled_statements():
+    engine = create_engine('sqlite://')
+    pizza_size = Order.__table__.c.pizza_size.type
+    order_status = Order.__table__.c.order_status.type
+
+    with engine.connect() as conn:
+        assert conn.execute(select(literal('LARGE',type_=pizza_size))).scalar() == 'LARGE'
+        assert conn.execute(select(literal('IN-TRANSIT',type_=order_status))).scalar() == 'IN-TRANSIT'
@@ -0,0 +1,67 @@
+def _place(client,headers,**order):
+    response = client.post('/order/order',json=order,headers=headers)
+    assert response.status_code == 201
+    return response.json()
+
+
+def test_batch_status_moves_only_legal_transitions(client,staff_headers):
+    pending = _place(client,staff_headers,quantity=1,pizza_size="SMALL")["id"]
+
+    response = client.patch('/order/order/status',
+                            json={"ids":[pending,999999],"order_status":"DELIVERED"},
+                            headers=staff_headers)
+    assert {item["id"]:item["result"] for item in response.json()["results"]} == {
+        pending:"illegal_transition",999999:"not_found"}
+
+    response = client.patch('/order/order/status',
+                            json={"ids":[pending],"order_status":"IN-TRANSIT"},
+                            headers=staff_headers)
+    assert response.json()["results"] == [{"id":pending,"result":"updated"}]
+
+
+def test_batch_status_rejects_pending_as_a_target(client,staff_headers):
+    response = client.patch('/order/order/status',
+                            json={"ids":[1],"order_status":"PENDING"},
+                            headers=staff_headers)
+    assert response.status_code == 422
+
+
+def test_orders_need_a_pizza_size(client,staff_headers):
+    response = client.post('/order/order',json={"quantity":1,"pizza_size":None},headers=staff_headers)
+    assert response.status_code == 422
+
+    response = client.post('/order/order',json={"quantity":1},headers=staff_headers)
+    assert response.json()["pizza_size"] == "SMALL"
+
+
+def test_order_stats_are_primed_only_once(client,staff_headers):
+    from database import Session,engine
+    from order_stats import order_stats
+
+    # The app primed them at startup already
+    with Session(bind=engine) as session:
+        assert not order_stats.prime(session)
+
+    before = order_stats.snapshot()["total_orders"]
+    _place(client,staff_headers,quantity=1,pizza_size="SMALL")
+    assert client.get('/order/stats',headers=staff_headers).json()["total_orders"] == before + 1
+
+
+def test_orders_keep_the_price_they_were_placed_at(client,staff_headers):
+    order = _place(client,staff_headers,quantity=2,pizza_size="EXTRA-LARGE")
+    price = client.get('/menu/',headers=staff_headers).json()["prices"]["EXTRA-LARGE"]
+    assert order["unit_price_cents"] == price
+    assert order["total_cents"] == 2 * price
+
+    billed = client.get('/order/report',headers=staff_headers).json()["total_cents"]
+    client.put('/menu/EXTRA-LARGE',json={"price_cents":price + 100},headers=staff_headers)
+    try:
+        assert client.get(f'/order/order/{order["id"]}',headers=staff_headers).json()["total_cents"] == 2 * price
+        assert client.get('/order/report',headers=staff_headers).json()["total_cents"] == billed
+
+        extra_large = client.get('/order/order',headers=staff_headers).json()
+        extra_large = sum(o["quantity"] for o in extra_large if o["pizza_size"] == "EXTRA-LARGE")
+        today = client.get('/order/report?at_current_prices=true',headers=staff_headers).json()
+        assert today["total_cents_by_size"]["EXTRA-LARGE"] == extra_large * (price + 100)
+    finally:
+        client.put('/menu/EXTRA-LARGE',json={"price_cents":price},headers=staff_headers)
@@ -0,0 +1,66 @@
+import os
+import time
+
+import pytest
+
+import server
+from server import pool_size_per_worker
+
+
+def test_pool_size_splits_the_budget():
+    assert pool_size_per_worker(100,8) == 12
+    assert pool_size_per_worker(8 * server.MIN_POOL_SIZE_PER_WORKER,8) == server.MIN_POOL_SIZE_PER_WORKER
+
+
+def test_pool_size_refuses_pools_too_small_for_a_worker():
+    with pytest.raises(ValueError):
+        pool_size_per_worker(4,8)
+    with pytest.raises(ValueError):
+        pool_size_per_worker(8 * server.MIN_POOL_SIZE_PER_WORKER - 1,8)
+
+
+class ExitingLauncher(server.Launcher):
+    """Forks workers that exit straight away with the given status."""
+
+    def __init__(self,workers,status):
+        super().__init__(None,workers,None)
+        self.status = status
+        self.spawned = 0
+
+    def spawn(self,worker_id):
+        pid = os.fork()
+        if pid == 0:
+            os._exit(self.status)
+        self.children[pid] = worker_id
+        self._spawned_at[worker_id] = time.monotonic()
+        self.spawned += 1
+
+
+def _reap_all(launcher):
+    deadline = time.monotonic() + 5
+    while launcher.children and time.monotonic() < deadline:
+        launcher.reap()
+        time.sleep(0.01)
+
+
+def test_a_worker_failing_to_start_stops_the_launcher(monkeypatch):
+    monkeypatch.setattr(server.signal,'signal',lambda *args:None)
+    launcher = ExitingLauncher(2,server.WORKER_BOOT_ERROR)
+
+    assert launcher.run() == server.WORKER_BOOT_ERROR
+    assert launcher.spawned == 2
+
+
+def test_a_crashing_worker_is_restarted_with_backoff():
+    launcher = ExitingLauncher(1,1)
+
+    delays = []
+    for _ in range(3):
+        launcher.spawn(0)
+        _reap_all(launcher)
+        delays.append(launcher._restarts.pop(0) - time.monotonic())
+
+    assert not launcher.stopping
+    assert delays[0] == pytest.approx(server.RESTART_BACKOFF,abs=0.1)
+    assert delays[1] == pytest.approx(2 * server.RESTART_BACKOFF,abs=0.1)
+    assert delays[2] == pytest.approx(4 * server.RESTART_BACKOFF,abs=0.1)